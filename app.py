@@ -1,20 +1,36 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session, make_response, flash, send_file
+from flask import Flask, render_template, request, redirect, url_for, jsonify, session, make_response, flash, send_file, Response, stream_with_context, g
 import json
-from datetime import datetime
-import calendar
-from dateutil.relativedelta import relativedelta
+from datetime import datetime, timedelta
 import os
 import secrets
-# from google import genai
-import google.generativeai as genai
-from PIL import Image, ImageDraw, ImageFont
 import io
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from dotenv import load_dotenv
-import textwrap
 from io import BytesIO
-# from google.genai import types
-from google.generativeai import types
+from disk_cache import DiskCache
+from storage import open_storage, EntryNotFound, VersionConflict, SUMMARY_SORTS, SEARCH_FACETS
+from jobs import JobQueue
+from singleflight import SingleFlight
+from concurrency import map_bounded, imap_bounded
+from gateway import ModelGateway, SharedTokenBucket
+from streaming import JSONArrayStreamParser
+import time
+import sqlite3
+import hashlib
+import uuid
+import re
+import threading
+import exports
+import render
+import thumbnails
+import cProfile
+import pstats
+from functools import lru_cache
+from collections import OrderedDict
+from metrics import Registry, SharedMetrics, TimedProxy
+from structured_logging import summarize_payload
+import logging
 # Load environment variables
 load_dotenv()
 
@@ -27,18 +43,166 @@ app.config.update(
     SESSION_COOKIE_HTTPONLY=True,
     SESSION_COOKIE_SAMESITE='Lax',
     PERMANENT_SESSION_LIFETIME=1800,  # 30 minutes session timeout
-    UPLOAD_FOLDER='uploads'
+    UPLOAD_FOLDER='uploads',
+    # Largest accepted request body, including uploaded reference images
+    MAX_CONTENT_LENGTH=int(os.environ.get('MAX_CONTENT_LENGTH', 32 * 1024 * 1024)),
+    # Reference images are kept once per distinct content; least recently used ones go first
+    UPLOAD_STORE_MAX_BYTES=int(os.environ.get('UPLOAD_STORE_MAX_BYTES', 500 * 1024 * 1024)),
+    PREVIEW_CACHE_DIR=os.environ.get('PREVIEW_CACHE_DIR', os.path.join('cache', 'previews')),
+    PREVIEW_CACHE_MAX_BYTES=int(os.environ.get('PREVIEW_CACHE_MAX_BYTES', 200 * 1024 * 1024)),
+    PREVIEW_WORKERS=int(os.environ.get('PREVIEW_WORKERS', 4)),
+    PREVIEW_TIMEOUT=float(os.environ.get('PREVIEW_TIMEOUT', 120)),
+    PREVIEW_BATCH_LIMIT=int(os.environ.get('PREVIEW_BATCH_LIMIT', 100)),
+    # Previews are first composited locally from the client's brand template; set to 0 to skip the AI upgrade
+    PREVIEW_AI_UPGRADE=os.environ.get('PREVIEW_AI_UPGRADE', '1') != '0',
+    RENDER_CACHE_DIR=os.environ.get('RENDER_CACHE_DIR', os.path.join('cache', 'rendered')),
+    RENDER_CACHE_MAX_BYTES=int(os.environ.get('RENDER_CACHE_MAX_BYTES', 100 * 1024 * 1024)),
+    VARIANT_CACHE_DIR=os.environ.get('VARIANT_CACHE_DIR', os.path.join('cache', 'variants')),
+    VARIANT_CACHE_MAX_BYTES=int(os.environ.get('VARIANT_CACHE_MAX_BYTES', 100 * 1024 * 1024)),
+    # Width of the preview variants shown in the calendar grid (150px tiles, 2x for high-DPI screens)
+    PREVIEW_GRID_WIDTH=int(os.environ.get('PREVIEW_GRID_WIDTH', 300)),
+    BRAND_ASSETS_DIR=os.environ.get('BRAND_ASSETS_DIR', 'brand_assets'),
+    # Page size limit for /api/clients
+    CLIENT_PAGE_LIMIT=int(os.environ.get('CLIENT_PAGE_LIMIT', 200)),
+    SEARCH_PAGE_LIMIT=int(os.environ.get('SEARCH_PAGE_LIMIT', 200)),
+    # Maximum entries changed by one bulk request
+    ENTRY_BULK_LIMIT=int(os.environ.get('ENTRY_BULK_LIMIT', 500)),
+    # Bearer token for scraping /metrics; without one it needs a logged-in session
+    METRICS_TOKEN=os.environ.get('METRICS_TOKEN'),
+    INSIGHT_CACHE_DIR=os.environ.get('INSIGHT_CACHE_DIR', os.path.join('cache', 'insights')),
+    INSIGHT_CACHE_MAX_BYTES=int(os.environ.get('INSIGHT_CACHE_MAX_BYTES', 20 * 1024 * 1024)),
+    CALENDAR_CACHE_DIR=os.environ.get('CALENDAR_CACHE_DIR', os.path.join('cache', 'calendars')),
+    CALENDAR_CACHE_MAX_BYTES=int(os.environ.get('CALENDAR_CACHE_MAX_BYTES', 50 * 1024 * 1024)),
+    CALENDAR_CACHE_TTL=int(os.environ.get('CALENDAR_CACHE_TTL', 7 * 24 * 3600)),
+    # Project calendars kept in memory per worker process; least recently read ones go first
+    CALENDAR_MEMORY_CACHE_SIZE=int(os.environ.get('CALENDAR_MEMORY_CACHE_SIZE', 256)),
+    CALENDAR_REPAIR_ATTEMPTS=int(os.environ.get('CALENDAR_REPAIR_ATTEMPTS', 1)),
+    IMAGE_ANALYSIS_WORKERS=int(os.environ.get('IMAGE_ANALYSIS_WORKERS', 4)),
+    IMAGE_ANALYSIS_TIMEOUT=float(os.environ.get('IMAGE_ANALYSIS_TIMEOUT', 60)),
+    IMAGE_ANALYSIS_MAX_SIZE=int(os.environ.get('IMAGE_ANALYSIS_MAX_SIZE', 1024)),
+    # Bulk calendar generation: months with more entries than CALENDAR_CHUNK_ENTRIES are split into parallel calls
+    CALENDAR_CHUNK_ENTRIES=int(os.environ.get('CALENDAR_CHUNK_ENTRIES', 12)),
+    BULK_GENERATION_WORKERS=int(os.environ.get('BULK_GENERATION_WORKERS', 4)),
+    BULK_GENERATION_TIMEOUT=float(os.environ.get('BULK_GENERATION_TIMEOUT', 300)),
+    BULK_GENERATION_MAX_MONTHS=int(os.environ.get('BULK_GENERATION_MAX_MONTHS', 600)),
+    # Seconds per Gemini call attempt, enforced by the gateway and the SDK client
+    GEMINI_TIMEOUT=float(os.environ.get('GEMINI_TIMEOUT', 60)),
+    # Logs are JSON lines (LOG_FORMAT=text for plain lines), written by a background thread
+    LOG_LEVEL=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+    LOG_FORMAT=os.environ.get('LOG_FORMAT', 'json'),
+    LOG_MAX_BYTES=int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+    LOG_BACKUP_COUNT=int(os.environ.get('LOG_BACKUP_COUNT', 5)),
+    # Share of DEBUG records kept when LOG_LEVEL=DEBUG
+    LOG_DEBUG_SAMPLE_RATE=float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.1)),
+    # Records waiting to be written beyond this are dropped (and counted) instead of blocking requests
+    LOG_QUEUE_SIZE=int(os.environ.get('LOG_QUEUE_SIZE', 10000))
 )
 
-# Ensure uploads directory exists
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
-    os.makedirs(app.config['UPLOAD_FOLDER'])
+# Prometheus metrics for this worker process, combined with the other workers' at /metrics
+metrics_registry = Registry()
+REQUEST_SECONDS = metrics_registry.histogram(
+    'http_request_duration_seconds', 'Time spent handling a request', ('endpoint', 'method', 'status')
+)
+STORAGE_SECONDS = metrics_registry.histogram(
+    'storage_operation_seconds', 'Time spent in storage operations', ('operation',)
+)
+GEMINI_SECONDS = metrics_registry.histogram(
+    'gemini_call_duration_seconds', 'Duration of Gemini calls, including retries', ('model', 'method', 'outcome')
+)
+GEMINI_TOKENS = metrics_registry.counter('gemini_tokens_total', 'Tokens reported by Gemini', ('model', 'kind'))
+GEMINI_BYTES = metrics_registry.counter(
+    'gemini_bytes_total', 'Text and inline data bytes sent to and received from Gemini', ('model', 'direction')
+)
+
+# Client and calendar storage (SQLite by default, see storage.py), opened by create_app()
+storage = None
+STORAGE_METHODS = (
+    'load', 'save', 'get_revision', 'client_names', 'get_client', 'generating_clients', 'put_client',
+    'create_client', 'get_project', 'replace_entries', 'materialize_calendar', 'add_entry', 'update_entry',
+    'delete_entry', 'delete_project', 'patch_entries', 'remove_entry', 'merge_month', 'client_summaries',
+    'search_entries'
+)
+
+# Background jobs (calendar generation, image analysis)
+job_queue = JobQueue(
+    os.environ.get('JOBS_DATABASE_PATH', 'jobs.db'),
+    workers=int(os.environ.get('JOB_WORKERS', 2)),
+    # Finished jobs and their progress events are deleted this long after they finish
+    keep_seconds=float(os.environ.get('JOB_RETENTION', 7 * 24 * 3600))
+)
+
+# Identical preview and calendar generations running in any worker are made once and shared.
+# The leader's Gemini calls stop retrying in time to finish within its lease, so no other worker
+# takes the lease over and pays for the same generation again.
+single_flight = SingleFlight(
+    os.environ.get('JOBS_DATABASE_PATH', 'jobs.db'),
+    lease_seconds=float(os.environ.get('SINGLE_FLIGHT_LEASE', 180)),
+    lead_context=lambda lease_seconds: gateway.deadline(lease_seconds * 0.9)
+)
+
+# Generated preview images, keyed by a hash of the prompt inputs
+preview_cache = DiskCache(
+    app.config['PREVIEW_CACHE_DIR'],
+    max_bytes=app.config['PREVIEW_CACHE_MAX_BYTES'],
+    suffix='.png'
+)
+
+# Locally composited previews, keyed by entry, brand template and size
+rendered_cache = DiskCache(app.config['RENDER_CACHE_DIR'], max_bytes=app.config['RENDER_CACHE_MAX_BYTES'], suffix='.png')
+
+# Resized WebP/JPEG variants of previews and renders, keyed by source key, width and format
+variant_cache = DiskCache(app.config['VARIANT_CACHE_DIR'], max_bytes=app.config['VARIANT_CACHE_MAX_BYTES'])
+
+# Reference image insights, keyed by image content hash
+insight_cache = DiskCache(app.config['INSIGHT_CACHE_DIR'], max_bytes=app.config['INSIGHT_CACHE_MAX_BYTES'], suffix='.txt')
+
+# Uploaded reference images, named by the SHA-256 of their content so identical files are stored once
+upload_store = DiskCache(app.config['UPLOAD_FOLDER'], max_bytes=app.config['UPLOAD_STORE_MAX_BYTES'])
+
+# Validated calendar responses, keyed by model id and normalized prompt
+calendar_response_cache = DiskCache(
+    app.config['CALENDAR_CACHE_DIR'],
+    max_bytes=app.config['CALENDAR_CACHE_MAX_BYTES'],
+    suffix='.json',
+    ttl=app.config['CALENDAR_CACHE_TTL']
+)
 
 # Configure Google Gemini AI
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 
-# Initialize client
-client = genai.Client()
+def create_genai_client():
+    # Imported here so workers that never call Gemini don't pay for the SDK
+    import google.generativeai as genai
+    # The SDK's own request timeout (in milliseconds) ends calls the gateway stopped waiting for
+    return genai.Client(http_options={'timeout': int(app.config['GEMINI_TIMEOUT'] * 1000)})
+
+def genai_types():
+    """google.generativeai.types, imported on first use."""
+    from google.generativeai import types
+    return types
+
+def record_gemini_call(call):
+    GEMINI_SECONDS.observe(call['seconds'], model=call['model'], method=call['method'], outcome=call['outcome'])
+    GEMINI_TOKENS.inc(call['prompt_tokens'], model=call['model'], kind='prompt')
+    GEMINI_TOKENS.inc(call['response_tokens'], model=call['model'], kind='response')
+    GEMINI_BYTES.inc(call['bytes_in'], model=call['model'], direction='in')
+    GEMINI_BYTES.inc(call['bytes_out'], model=call['model'], direction='out')
+
+# All model calls go through the gateway for timeouts, retries, rate limiting and circuit breaking
+gateway = ModelGateway(
+    client_factory=create_genai_client,
+    timeout=app.config['GEMINI_TIMEOUT'],
+    max_retries=int(os.environ.get('GEMINI_MAX_RETRIES', 3)),
+    # One request budget for all worker processes, kept next to the job queue
+    bucket=SharedTokenBucket(
+        float(os.environ.get('GEMINI_REQUESTS_PER_MINUTE', 60)) / 60.0,
+        int(os.environ.get('GEMINI_BURST', 10)),
+        path=os.environ.get('JOBS_DATABASE_PATH', 'jobs.db')
+    ),
+    failure_threshold=int(os.environ.get('GEMINI_FAILURE_THRESHOLD', 5)),
+    reset_timeout=float(os.environ.get('GEMINI_RESET_TIMEOUT', 30)),
+    observer=record_gemini_call
+)
 
 # Model IDs
 TEXT_MODEL_ID = "models/gemini-2.0-flash"
@@ -54,35 +218,129 @@ if 'RENDER' in os.environ:
 
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', "admin@alvina19")
 
-# Production error logging
-if not app.debug:
-    import logging
+# Queue handler feeding the log writers; set up by configure_logging()
+log_handler = None
+
+def configure_logging():
+    """Production logging.
+
+    Records from the app, job and gateway loggers go through the root
+    logger onto a bounded queue; a background thread formats them and
+    writes them to logs/app.log and stderr, so requests never wait on
+    log I/O.
+    """
+    global log_handler
+    if app.debug:
+        return
     from logging.handlers import RotatingFileHandler
+    from flask.logging import default_handler
+    from structured_logging import AsyncLogHandler, DebugSampler, JSONFormatter
     
     # Use Render's log directory if available
     log_dir = os.environ.get('RENDER_LOG_DIR', 'logs')
     if not os.path.exists(log_dir):
         os.mkdir(log_dir)
     
+    if app.config['LOG_FORMAT'] == 'text':
+        formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+    else:
+        formatter = JSONFormatter()
     file_handler = RotatingFileHandler(
         os.path.join(log_dir, 'app.log'),
-        maxBytes=10240,
-        backupCount=10
+        maxBytes=app.config['LOG_MAX_BYTES'],
+        backupCount=app.config['LOG_BACKUP_COUNT']
     )
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-    ))
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.setLevel(logging.INFO)
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+    
+    log_handler = AsyncLogHandler([file_handler, stream_handler], queue_size=app.config['LOG_QUEUE_SIZE'])
+    log_handler.addFilter(DebugSampler(app.config['LOG_DEBUG_SAMPLE_RATE']))
+    root = logging.getLogger()
+    root.addHandler(log_handler)
+    root.setLevel(app.config['LOG_LEVEL'])
+    # Flask's own stderr handler would write synchronously and duplicate every record
+    app.logger.removeHandler(default_handler)
+    app.logger.setLevel(app.config['LOG_LEVEL'])
     app.logger.info('Application startup')
 
+_initialized = False
+_init_lock = threading.Lock()
+
+def create_app():
+    """Application factory: finish process setup and return the app.
+
+    Opens storage (importing data.json on first run), creates the upload
+    folder and configures logging. Run it once in the gunicorn master with
+    `gunicorn 'app:create_app()' --preload`. The Gemini SDK and Pillow are
+    still only imported when first used. Safe to call repeatedly.
+    """
+    global storage, _initialized
+    with _init_lock:
+        if _initialized:
+            return app
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        configure_logging()
+        storage = TimedProxy(open_storage(), STORAGE_SECONDS, methods=STORAGE_METHODS)
+        _initialized = True
+    return app
+
 def check_auth():
     return session.get('authenticated', False)
 
+@app.before_request
+def ensure_initialized():
+    # Deployments still pointing at app:app set up on their first request
+    if not _initialized:
+        create_app()
+
+@app.before_request
+def start_job_workers():
+    # Started lazily so each forked gunicorn worker runs its own pool
+    job_queue.start()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Opt-in profiling for logged-in admins: ?profile=1 or an X-Profile: 1 header
+    if (request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1') and check_auth():
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def finish_request_timer(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            endpoint=request.endpoint or 'unmatched',
+            method=request.method,
+            status=response.status_code
+        )
+    try:
+        shared_metrics.publish()
+    except sqlite3.Error as e:
+        app.logger.error(f"Error publishing metrics: {str(e)}")
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    # Streamed bodies are produced after this point, so only the view itself is profiled
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(50)
+    # add_header has already run on the view's response, so the report needs its own
+    return add_header(Response(report.getvalue(), mimetype='text/plain'))
+
+# Image routes whose responses set their own ETag and Cache-Control
+CACHED_IMAGE_ENDPOINTS = {'preview_image', 'render_preview'}
+
 @app.after_request
 def add_header(response):
-    # Prevent caching of all responses
+    # Cached previews and renders manage caching themselves; other responses with an
+    # ETag (such as entry versions) must still never be stored
+    if request.endpoint in CACHED_IMAGE_ENDPOINTS and response.headers.get('ETag'):
+        return response
+    # Prevent caching of all other responses
     response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '-1'
@@ -107,21 +365,10 @@ def logout():
     return response
 
 def load_data():
-    try:
-        with open('data.json', 'r') as f:
-            data = json.load(f)
-            # Ensure required keys exist
-            if 'clients' not in data:
-                data['clients'] = {}
-            if 'projects' not in data:
-                data['projects'] = {}
-            return data
-    except FileNotFoundError:
-        return {"clients": {}, "projects": {}}
+    return storage.load()
 
 def save_data(data):
-    with open('data.json', 'w') as f:
-        json.dump(data, f, indent=4)
+    storage.save(data)
 
 @app.route('/')
 def index():
@@ -133,163 +380,457 @@ def index():
 def clients():
     if not check_auth():
         return redirect(url_for('login'))
-    data = load_data()
-    return render_template('client_management.html', clients=data.get('clients', {}))
+    # The client list is fetched page by page from /api/clients
+    return render_template('client_management.html')
+
+@app.route('/api/clients')
+def list_clients():
+    """One page of client summaries, without calendar bodies.
+
+    Query: page (from 1), per_page, sort (name, month, posts, entries,
+    status, updated), order (asc or desc), q (part of the name), status.
+    """
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 50))
+    except ValueError:
+        return jsonify({"error": "page and per_page must be numbers"}), 400
+    if page < 1 or not 1 <= per_page <= app.config['CLIENT_PAGE_LIMIT']:
+        return jsonify({"error": f"page must be at least 1 and per_page between 1 and {app.config['CLIENT_PAGE_LIMIT']}"}), 400
+    sort = request.args.get('sort', 'name')
+    if sort not in SUMMARY_SORTS:
+        return jsonify({"error": f"sort must be one of {', '.join(SUMMARY_SORTS)}"}), 400
+    order = request.args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        return jsonify({"error": "order must be asc or desc"}), 400
+    
+    total, summaries = storage.client_summaries(
+        sort=sort,
+        descending=order == 'desc',
+        limit=per_page,
+        offset=(page - 1) * per_page,
+        query=request.args.get('q') or None,
+        status=request.args.get('status') or None
+    )
+    return jsonify({
+        "clients": summaries,
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "pages": -(-total // per_page)
+    })
 
-def generate_text(prompt):
+def generate_text(prompt, config=None):
     """Generate text using Gemini."""
     try:
-        response = client.models.generate_content(
+        response = gateway.generate_content(
             model=TEXT_MODEL_ID,
-            contents=prompt
+            contents=prompt,
+            config=config
         )
         return response.text
     except Exception as e:
         app.logger.error(f"Error generating text: {str(e)}")
         return None
 
-def generate_content_calendar(client_name, industry, target_audience, goals, target_month, platforms, num_posts, num_reels):
+# Content types per platform, with proper case
+PLATFORM_CONTENT_TYPES = {
+    'Instagram': ['Image', 'Reel', 'Carousel'],
+    'Facebook': ['Image', 'Video', 'Status'],
+    'LinkedIn': ['Article', 'Image', 'Video'],
+    'Twitter': ['Tweet', 'Thread', 'Poll']
+}
+
+CALENDAR_FIELDS = ('date', 'platform', 'content_type', 'topic', 'description', 'hashtags', 'call_to_action')
+
+def normalize_platforms(platforms):
+    """Proper-case platform names, as a tuple usable as a cache key."""
+    return tuple(
+        next((k for k in PLATFORM_CONTENT_TYPES if k.lower() == platform.lower()), platform)
+        for platform in platforms
+    )
+
+def allowed_content_types_for(normalized_platforms):
+    return list(dict.fromkeys(
+        content_type
+        for platform in normalized_platforms
+        for content_type in PLATFORM_CONTENT_TYPES.get(platform, [])
+    ))
+
+@lru_cache(maxsize=64)
+def calendar_response_schema(normalized_platforms):
+    """Response schema for calendar generation, built once per platform set."""
+    content_types = allowed_content_types_for(normalized_platforms)
+    return {
+        'type': 'ARRAY',
+        'items': {
+            'type': 'OBJECT',
+            'properties': {
+                'date': {'type': 'STRING', 'description': 'YYYY-MM-DD'},
+                'platform': {'type': 'STRING', 'enum': list(normalized_platforms)},
+                'content_type': dict({'type': 'STRING'}, **({'enum': content_types} if content_types else {})),
+                'topic': {'type': 'STRING'},
+                'description': {'type': 'STRING', 'description': 'At most 15 words'},
+                'hashtags': {'type': 'STRING'},
+                'call_to_action': {'type': 'STRING', 'description': 'At most 10 words'},
+            },
+            'required': list(CALENDAR_FIELDS),
+            'propertyOrdering': list(CALENDAR_FIELDS),
+        },
+    }
+
+@lru_cache(maxsize=64)
+def calendar_generation_config(normalized_platforms):
+    """Ask for JSON matching the calendar schema instead of describing the format in the prompt."""
+    return genai_types().GenerateContentConfig(
+        response_mime_type='application/json',
+        response_schema=calendar_response_schema(normalized_platforms)
+    )
+
+@lru_cache(maxsize=64)
+def calendar_prompt_template(normalized_platforms):
+    """Compact calendar prompt for a platform set, filled in with str.format per client."""
+    platform_lines = '\n'.join(
+        f"- {platform}: {', '.join(PLATFORM_CONTENT_TYPES[platform])}" if platform in PLATFORM_CONTENT_TYPES
+        else f"- {platform}"
+        for platform in normalized_platforms
+    ).replace('{', '{{').replace('}', '}}')
+    return (
+        "Create a social media content calendar for {client_name}, a {industry} business targeting {target_audience}.\n"
+        "Goals: {goals}\n"
+        "Create exactly {total_posts} entries ({num_posts} posts, {num_reels} reels) dated between "
+        "{first_day} and {last_day}, in chronological order.\n"
+        "Platforms and the content types to use on each:\n"
+        f"{platform_lines}\n"
+        "Descriptions at most 15 words, calls to action at most 10 words, with relevant hashtags. "
+        "Content must serve the goals and the audience."
+    )
+
+def clean_model_json(response_text):
+    """Strip markdown code fences the model sometimes wraps JSON in."""
+    response_text = response_text.strip()
+    if response_text.startswith('```json'):
+        response_text = response_text[7:]
+    if response_text.endswith('```'):
+        response_text = response_text[:-3]
+    return response_text.strip()
+
+def clamp_entry_date(entry_date, first_day, last_day):
+    """Move a date into [first_day, last_day], keeping its day of month when that day is in range."""
     try:
-        # Parse the target month (expected format: YYYY-MM)
-        year, month = map(int, target_month.split('-'))
+        same_day = first_day.replace(day=entry_date.day)
+    except ValueError:
+        same_day = None
+    if same_day is not None and first_day <= same_day <= last_day:
+        return same_day
+    return min(max(entry_date, first_day), last_day)
+
+def validate_calendar_entries(calendar_data, first_day, last_day, normalized_platforms, allowed_content_types):
+    """Check every generated entry, fixing deterministic problems in place.
+
+    Platform and content type casing is normalized, dates outside the target
+    range are moved into it and long calls to action are trimmed. Returns
+    (valid_entries, invalid) where invalid holds (entry, violations) pairs
+    for entries only the model can fix.
+    """
+    if not isinstance(calendar_data, list):
+        raise ValueError("Calendar response is not a JSON array")
+    
+    valid = []
+    invalid = []
+    for entry in calendar_data:
+        if not isinstance(entry, dict):
+            continue
+        violations = []
         
-        # Get the first and last day of the target month
-        first_day = datetime(year, month, 1)
-        last_day = datetime(year, month + 1, 1) - relativedelta(days=1)
+        missing = [field for field in CALENDAR_FIELDS if not str(entry.get(field) or '').strip()]
+        if missing:
+            violations.append(f"Missing fields: {', '.join(missing)}")
         
-        # Calculate total posts needed
-        total_posts = num_posts + num_reels
+        try:
+            entry_date = datetime.strptime(str(entry.get('date')), '%Y-%m-%d')
+            if not (first_day <= entry_date <= last_day):
+                entry['date'] = clamp_entry_date(entry_date, first_day, last_day).strftime('%Y-%m-%d')
+        except ValueError:
+            violations.append(f"Invalid date {entry.get('date')} - must be YYYY-MM-DD between {first_day.strftime('%Y-%m-%d')} and {last_day.strftime('%Y-%m-%d')}")
         
-        # Create content type mapping with proper case
-        content_types = {
-            'Instagram': ['Image', 'Reel', 'Carousel'],
-            'Facebook': ['Image', 'Video', 'Status'],
-            'LinkedIn': ['Article', 'Image', 'Video'],
-            'Twitter': ['Tweet', 'Thread', 'Poll']
-        }
+        platform = str(entry.get('platform') or '')
+        entry_platform = next((p for p in normalized_platforms if p.lower() == platform.lower()), None)
+        if entry_platform:
+            entry['platform'] = entry_platform
+        else:
+            violations.append(f"Invalid platform {platform} - must be one of {', '.join(normalized_platforms)}")
         
-        # Normalize platform names to proper case
-        normalized_platforms = []
-        for platform in platforms:
-            # Find the proper case version of the platform name
-            proper_case = next((k for k in content_types.keys() if k.lower() == platform.lower()), platform)
-            normalized_platforms.append(proper_case)
+        content_type = str(entry.get('content_type') or '')
+        entry_content_type = next((t for t in allowed_content_types if t.lower() == content_type.lower()), None)
+        if entry_content_type:
+            entry['content_type'] = entry_content_type
+        else:
+            violations.append(f"Invalid content type {content_type} - must be one of {', '.join(allowed_content_types)}")
         
-        # Filter content types based on selected platforms
-        allowed_content_types = []
-        for platform in normalized_platforms:
-            if platform in content_types:
-                allowed_content_types.extend(content_types[platform])
+        if len(str(entry.get('description') or '').split()) > 15:
+            violations.append("Description too long - must be maximum 15 words")
         
-        prompt = f"""Generate a content calendar for {client_name}, a {industry} business targeting {target_audience}.
-        Goals: {goals}
+        call_to_action = str(entry.get('call_to_action') or '').split()
+        if len(call_to_action) > 10:
+            entry['call_to_action'] = ' '.join(call_to_action[:10])
         
-        IMPORTANT: You MUST generate a JSON array with EXACT dates for {first_day.strftime('%B %Y')}.
-        Each entry MUST have a valid date in YYYY-MM-DD format.
+        if violations:
+            invalid.append((entry, violations))
+        else:
+            valid.append(entry)
+    return valid, invalid
+
+def repair_calendar_entries(invalid, first_day, last_day, normalized_platforms, allowed_content_types):
+    """Ask the model to fix only the entries that failed validation."""
+    problems = [{"entry": entry, "problems": violations} for entry, violations in invalid]
+    prompt = f"""Fix these social media calendar entries so that they follow every rule.
+    Rules:
+    - date: YYYY-MM-DD between {first_day.strftime('%Y-%m-%d')} and {last_day.strftime('%Y-%m-%d')}
+    - platform: one of {', '.join(normalized_platforms)}
+    - content_type: one of {', '.join(allowed_content_types)}
+    - description: a concise phrase with maximum 15 words
+    - call_to_action: a short phrase with maximum 10 words
+    - every entry has the fields {', '.join(CALENDAR_FIELDS)}
+    
+    Entries and their problems:
+    {json.dumps(problems)}
+    
+    IMPORTANT: Respond with ONLY a JSON array of the {len(invalid)} corrected entries, in the same order.
+    """
+    response_text = generate_text(prompt, config=calendar_generation_config(tuple(normalized_platforms)))
+    if not response_text:
+        return []
+    try:
+        repaired = json.loads(clean_model_json(response_text))
+    except json.JSONDecodeError as e:
+        app.logger.error(f"Could not parse repaired calendar entries: {str(e)}")
+        return []
+    return repaired if isinstance(repaired, list) else []
+
+def stream_calendar_entries(prompt, on_entry, first_day, last_day, normalized_platforms, allowed_content_types):
+    """Generate with a streaming call, validating each entry and passing it to on_entry as soon as it is complete.
+
+    Returns (valid_entries, invalid) like validate_calendar_entries, or (None, None) on failure.
+    """
+    parser = JSONArrayStreamParser()
+    valid = []
+    invalid = []
+    try:
+        for chunk in gateway.generate_content_stream(
+            model=TEXT_MODEL_ID,
+            contents=prompt,
+            config=calendar_generation_config(tuple(normalized_platforms))
+        ):
+            for item in parser.feed(getattr(chunk, 'text', None) or ''):
+                fixed, failed = validate_calendar_entries(
+                    [item], first_day, last_day, normalized_platforms, allowed_content_types
+                )
+                for entry in fixed:
+                    on_entry(entry)
+                valid.extend(fixed)
+                invalid.extend(failed)
+        parser.close()
+    except Exception as e:
+        app.logger.error(f"Error streaming content calendar: {str(e)}")
+        return None, None
+    return valid, invalid
+
+def month_bounds(target_month):
+    """First and last day of a YYYY-MM month."""
+    from dateutil.relativedelta import relativedelta
+    year, month = map(int, target_month.split('-'))
+    first_day = datetime(year, month, 1)
+    return first_day, first_day + relativedelta(months=1) - relativedelta(days=1)
+
+def generate_content_calendar(client_name, industry, target_audience, goals, target_month, platforms, num_posts, num_reels, regenerate=False, on_entry=None, date_range=None):
+    """Generate and validate a calendar, reusing a cached response for an identical prompt unless regenerate is set.
+
+    When on_entry is given the model output is streamed, and every valid
+    entry is passed to it as soon as it has been parsed. date_range
+    (first_day, last_day) narrows generation to part of the month.
+    """
+    try:
+        # Get the first and last day of the target month (expected format: YYYY-MM)
+        first_day, last_day = date_range or month_bounds(target_month)
         
-        Selected Platforms: {', '.join(normalized_platforms)}
-        Number of Posts: {num_posts}
-        Number of Reels: {num_reels}
-        Allowed Content Types: {', '.join(allowed_content_types)}
+        normalized_platforms = normalize_platforms(platforms)
+        allowed_content_types = allowed_content_types_for(normalized_platforms)
         
-        Format the response as a JSON array with the following structure:
-        [
-            {{
-                "date": "YYYY-MM-DD",  # Must be a valid date between {first_day.strftime('%Y-%m-%d')} and {last_day.strftime('%Y-%m-%d')}
-                "platform": "platform_name",  # Must be one of: {', '.join(normalized_platforms)}
-                "content_type": "type_of_content",  # Must be one of: {', '.join(allowed_content_types)}
-                "topic": "main_topic",
-                "description": "short_phrase",  # MUST be a concise phrase with maximum 15 words
-                "hashtags": "relevant_hashtags",
-                "call_to_action": "action_phrase"  # MUST be a short phrase with maximum 10 words
-            }}
-        ]
+        # The output format is declared in the response schema, so the prompt only carries the brief
+        prompt = calendar_prompt_template(normalized_platforms).format(
+            client_name=client_name,
+            industry=industry,
+            target_audience=target_audience,
+            goals=goals,
+            total_posts=num_posts + num_reels,
+            num_posts=num_posts,
+            num_reels=num_reels,
+            first_day=first_day.strftime('%Y-%m-%d'),
+            last_day=last_day.strftime('%Y-%m-%d')
+        )
         
-        Requirements:
-        1. Generate exactly {total_posts} posts
-        2. Use only the selected platforms: {', '.join(normalized_platforms)}
-        3. Use only the allowed content types: {', '.join(allowed_content_types)}
-        4. Each entry MUST have a valid date
-        5. Dates must be in chronological order
-        6. Content should align with business goals and target audience
-        7. Include relevant hashtags and call-to-action phrases
-        8. For each platform, use appropriate content types:
-           - Instagram: {', '.join(content_types['Instagram'])}
-           - Facebook: {', '.join(content_types['Facebook'])}
-           - LinkedIn: {', '.join(content_types['LinkedIn'])}
-           - Twitter: {', '.join(content_types['Twitter'])}
-        9. Keep descriptions concise and impactful (max 15 words)
-        10. Keep call-to-action phrases short and clear (max 10 words)
+        cache_key = DiskCache.make_key(TEXT_MODEL_ID, 'json-schema', ' '.join(prompt.split()))
+        if not regenerate:
+            cached = calendar_response_cache.get(cache_key)
+            if cached is not None:
+                result = cached.decode('utf-8')
+                if on_entry:
+                    for entry in json.loads(result):
+                        on_entry(entry)
+                return result
         
-        IMPORTANT: Your response must be ONLY the JSON array, with no additional text or formatting.
-        """
+        streamed = False
         
-        response_text = generate_text(prompt)
-        if not response_text:
-            return None
+        def produce():
+            nonlocal streamed
+            streamed = True
+            if on_entry:
+                valid, invalid = stream_calendar_entries(
+                    prompt, on_entry, first_day, last_day, normalized_platforms, allowed_content_types
+                )
+                if valid is None:
+                    return None
+            else:
+                response_text = generate_text(prompt, config=calendar_generation_config(normalized_platforms))
+                if not response_text:
+                    return None
             
-        response_text = response_text.strip()
-        
-        # Remove any markdown formatting if present
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
+                try:
+                    # JSON mode responses need no cleanup; fences are stripped in case a model ignores it
+                    calendar_data = json.loads(clean_model_json(response_text))
+                except json.JSONDecodeError as e:
+                    app.logger.error(f"Calendar response is not valid JSON: {str(e)}")
+                    return None
+            
+                # Validate every entry, then send only the ones that are still invalid back for repair
+                valid, invalid = validate_calendar_entries(
+                    calendar_data, first_day, last_day, normalized_platforms, allowed_content_types
+                )
+            for attempt in range(app.config['CALENDAR_REPAIR_ATTEMPTS']):
+                if not invalid:
+                    break
+                app.logger.info(f"Repairing {len(invalid)} invalid calendar entries (attempt {attempt + 1})")
+                repaired = repair_calendar_entries(invalid, first_day, last_day, normalized_platforms, allowed_content_types)
+                if not repaired:
+                    break
+                fixed, invalid = validate_calendar_entries(
+                    repaired, first_day, last_day, normalized_platforms, allowed_content_types
+                )
+                if on_entry:
+                    for entry in fixed:
+                        on_entry(entry)
+                valid.extend(fixed)
         
-        print(f"Raw API response: {response_text}")  # Debug log
+            if invalid:
+                app.logger.warning(
+                    f"Dropping {len(invalid)} calendar entries that could not be repaired: "
+                    f"{[violations for _, violations in invalid]}"
+                )
+            if not valid:
+                return None
         
-        try:
-            calendar_data = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {str(e)}")
-            print(f"Response text: {response_text}")
-            return None
+            # Dates must be in chronological order
+            valid.sort(key=lambda entry: entry['date'])
+            result = json.dumps(valid)
         
-        # Validate dates and content types
-        for entry in calendar_data:
-            entry_date = datetime.strptime(entry['date'], '%Y-%m-%d')
-            if not (first_day <= entry_date <= last_day):
-                raise ValueError(f"Invalid date {entry['date']} - must be between {first_day.strftime('%Y-%m-%d')} and {last_day.strftime('%Y-%m-%d')}")
-            
-            # Normalize platform name for comparison
-            entry_platform = next((k for k in content_types.keys() if k.lower() == entry['platform'].lower()), entry['platform'])
-            if entry_platform not in normalized_platforms:
-                raise ValueError(f"Invalid platform {entry['platform']} - must be one of {', '.join(normalized_platforms)}")
-            
-            if entry['content_type'] not in allowed_content_types:
-                raise ValueError(f"Invalid content type {entry['content_type']} - must be one of {', '.join(allowed_content_types)}")
-            
-            # Update the platform name to proper case
-            entry['platform'] = entry_platform
-            
-            # Validate description length
-            if len(entry['description'].split()) > 15:
-                raise ValueError(f"Description too long: {entry['description']} - must be maximum 15 words")
-            
-            # Validate call-to-action length
-            if len(entry['call_to_action'].split()) > 10:
-                raise ValueError(f"Call-to-action too long: {entry['call_to_action']} - must be maximum 10 words")
+            # Only complete calendars that passed validation are cached
+            if not invalid:
+                calendar_response_cache.set(cache_key, result.encode('utf-8'))
+            return result
         
-        return json.dumps(calendar_data)
+        # Concurrent requests for the same calendar, from any worker, share one generation
+        result = single_flight.do(f"calendar:{cache_key}", produce)
+        if result is not None and on_entry and not streamed:
+            for entry in json.loads(result):
+                on_entry(entry)
+        return result
     except Exception as e:
-        print(f"Error generating content calendar: {str(e)}")
+        app.logger.error(f"Error generating content calendar: {str(e)}")
         return None
 
-def analyze_reference_images(image_files):
+IMAGE_ANALYSIS_PROMPT = "Analyze this reference image and provide insights for social media content creation. Include style, mood, color scheme, and potential content themes."
+
+def prepare_reference_image(path):
+    """Downscale and re-encode an image so less data is sent to and decoded by the model.
+
+    Image.open only reads the header; draft() lets JPEGs decode at reduced
+    scale and thumbnail() shrinks the rest, so a large photo is never held
+    in memory at full resolution.
+    """
+    from PIL import Image
+    max_size = app.config['IMAGE_ANALYSIS_MAX_SIZE']
+    with Image.open(path) as img:
+        img.draft('RGB', (max_size, max_size))
+        img.thumbnail((max_size, max_size))
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        buffer = BytesIO()
+        img.save(buffer, format='JPEG', quality=85)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+def analyze_reference_image(path):
+    response = gateway.generate_content(
+        model=IMAGE_MODEL_ID,
+        contents=[
+            IMAGE_ANALYSIS_PROMPT,
+            prepare_reference_image(path)
+        ]
+    )
+    return response.text
+
+def analyze_reference_images(images):
+    """Analyze stored reference images concurrently.
+
+    Each distinct image is analyzed once: insights are cached by content
+    hash, and a job analyzing an image that another worker is already
+    analyzing waits for that result.
+    """
     try:
-        image_insights = []
-        for image in image_files:
-            img = Image.open(image)
-            response = client.models.generate_content(
-                model=IMAGE_MODEL_ID,
-                contents=[
-                    "Analyze this reference image and provide insights for social media content creation. Include style, mood, color scheme, and potential content themes.",
-                    img
-                ]
+        digests = list(images)
+        keys = [DiskCache.make_key(IMAGE_MODEL_ID, IMAGE_ANALYSIS_PROMPT, digest) for digest in digests]
+        
+        image_insights = [None] * len(digests)
+        to_analyze = {}  # Cache key -> image digest, so duplicates in one upload are analyzed once
+        for i, key in enumerate(keys):
+            cached = insight_cache.get(key)
+            if cached is not None:
+                image_insights[i] = cached.decode('utf-8')
+            else:
+                to_analyze.setdefault(key, digests[i])
+        
+        def analyze(key):
+            def run():
+                stored = upload_store.lookup(to_analyze[key])
+                if stored is None:
+                    raise FileNotFoundError(f"Reference image {to_analyze[key]} is no longer stored")
+                text = analyze_reference_image(stored[0])
+                if not text:
+                    return None
+                insight_cache.set(key, text.encode('utf-8'))
+                return text
+            found = single_flight.do(f"insight:{key}", run, lookup=lambda: insight_cache.get(key))
+            return found.decode('utf-8') if isinstance(found, bytes) else found
+        
+        if to_analyze:
+            pending_keys = list(to_analyze)
+            results = map_bounded(
+                analyze,
+                pending_keys,
+                max_workers=app.config['IMAGE_ANALYSIS_WORKERS'],
+                timeout=app.config['IMAGE_ANALYSIS_TIMEOUT'],
+                on_error=lambda i, e: app.logger.error(f"Error analyzing image {i}: {str(e)}")
             )
-            image_insights.append(response.text)
-        return "\n\n".join(image_insights)
+            analyzed = dict(zip(pending_keys, results))
+            for i, key in enumerate(keys):
+                if image_insights[i] is None:
+                    image_insights[i] = analyzed.get(key)
+        
+        image_insights = [insight for insight in image_insights if insight]
+        return "\n\n".join(image_insights) if image_insights else None
     except Exception as e:
         app.logger.error(f"Error analyzing images: {str(e)}")
         return None
@@ -300,8 +841,6 @@ def add_client():
         return jsonify({"success": False, "error": "Unauthorized"}), 401
     
     try:
-        data = load_data()
-        
         # Get form data
         client_data = {
             'companyName': request.form['companyName'],
@@ -311,110 +850,502 @@ def add_client():
             'targetMonth': request.form['targetMonth'],
             'suggestions': request.form.get('suggestions', '')
         }
+        company_name = client_data['companyName']
+        job_id = uuid.uuid4().hex
         
-        # Handle image uploads
-        image_insights = None
-        if 'suggestionImages' in request.files:
-            files = request.files.getlist('suggestionImages')
-            if files and any(file.filename != '' for file in files):
-                image_insights = analyze_reference_images(files)
-                if image_insights:
-                    client_data['imageInsights'] = image_insights
-        
-        # Generate content calendar with target month and platform selections
-        content_calendar = generate_content_calendar(
-            client_data['companyName'], 
-            '', 
-            '', 
-            '', 
-            client_data['targetMonth'],
-            client_data['platforms'],
-            client_data['numPosts'],
-            client_data['numReels']
-        )
-        if content_calendar:
-            client_data['contentCalendar'] = content_calendar
-        else:
-            return jsonify({"success": False, "error": "Failed to generate content calendar"})
+        # Stream uploaded images into the content-addressed store; the background job
+        # decodes them, and images already uploaded for any client are not stored again
+        image_keys = [
+            upload_store.store_stream(file.stream)[0]
+            for file in request.files.getlist('suggestionImages') if file.filename != ''
+        ]
         
-        # Save client data
-        company_name = client_data['companyName']
-        if company_name not in data['clients']:
-            data['clients'][company_name] = client_data
-            save_data(data)
-            
-            # Create project entries for the content calendar
-            data['projects'][company_name] = {
-                "calendar_entries": []
-            }
-            save_data(data)
-            
-            return jsonify({"success": True})
-        else:
+        # Reserve the client so the list shows it as generating
+        client_data['status'] = 'generating'
+        client_data['jobId'] = job_id
+        if not storage.create_client(company_name, client_data):
             return jsonify({"success": False, "error": "Client already exists"})
+        
+        job_queue.submit('add_client', {
+            'client': client_data,
+            'images': image_keys,
+            'regenerate': request.form.get('regenerate') == '1'
+        }, job_id=job_id)
+        return jsonify({"success": True, "job_id": job_id}), 202
             
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         app.logger.error(f"Error adding client: {str(e)}")
         return jsonify({"success": False, "error": str(e)})
 
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    limit = app.config['MAX_CONTENT_LENGTH'] / (1024 * 1024)
+    return jsonify({"success": False, "error": f"Upload too large; the limit is {limit:g} MB"}), 413
+
+@job_queue.register('add_client')
+def run_add_client_job(payload, job_id):
+    """Analyze reference images and generate the calendar for a reserved client."""
+    client_data = payload['client']
+    company_name = client_data['companyName']
+    if payload['images']:
+        image_insights = analyze_reference_images(payload['images'])
+        if image_insights:
+            client_data['imageInsights'] = image_insights
+    
+    # Generate content calendar with target month and platform selections
+    content_calendar = generate_content_calendar(
+        company_name, 
+        '', 
+        '', 
+        '', 
+        client_data['targetMonth'],
+        client_data['platforms'],
+        client_data['numPosts'],
+        client_data['numReels'],
+        regenerate=payload.get('regenerate', False),
+        # Publish entries as they stream in so the dashboard can show them early
+        on_entry=lambda entry: job_queue.add_event(job_id, {'type': 'entry', 'entry': to_calendar_entry(entry)})
+    )
+    if not content_calendar:
+        raise RuntimeError("Failed to generate content calendar")
+    
+    client_data['contentCalendar'] = content_calendar
+    client_data['status'] = 'ready'
+    with storage.transaction():
+        storage.put_client(company_name, client_data)
+        storage.materialize_calendar(company_name, build_calendar_entries(content_calendar), CALENDAR_VERSION)
+    invalidate_calendar(company_name)
+    return {"client": company_name}
+
+@job_queue.on_failure('add_client')
+def release_reserved_client(payload, job_id, error):
+    """Release the name reserved for a failed job so the client can be added again."""
+    company_name = payload['client']['companyName']
+    client_data = storage.get_client(company_name)
+    # Only the reservation made for this job; never a client that finished or was re-added
+    if client_data and client_data.get('status') == 'generating' and client_data.get('jobId') == job_id:
+        storage.delete_project(company_name)
+        invalidate_calendar(company_name)
+        app.logger.info(f"Released client {company_name} after job {job_id} failed: {error}")
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream a job's progress events as server-sent events until it finishes."""
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    if job_queue.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    try:
+        after = int(request.headers.get('Last-Event-ID') or request.args.get('after', 0))
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID and after must be event ids"}), 400
+    
+    def generate():
+        last_seq = after
+        polls = 0
+        while True:
+            # Read the status first: events are written before a job finishes
+            job = job_queue.get(job_id)
+            if job is None:
+                # Purged or deleted while the client was listening
+                yield sse_event({"status": "gone", "error": "Job not found"}, event='status')
+                return
+            for seq, data in job_queue.events(job_id, last_seq):
+                last_seq = seq
+                yield sse_event(data, event=data.get('type'), event_id=seq)
+            if job['status'] in ('done', 'failed'):
+                yield sse_event({"status": job['status'], "error": job['error']}, event='status')
+                return
+            polls += 1
+            if polls % 30 == 0:
+                yield ": keepalive\n\n"
+            time.sleep(0.5)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def month_range(first, last):
+    """YYYY-MM strings from first to last inclusive."""
+    year, month = map(int, first.split('-'))
+    months = []
+    while f"{year:04d}-{month:02d}" <= last:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def calendar_chunks(target_month, num_posts, num_reels, chunk_entries):
+    """Split a month into consecutive date ranges of at most chunk_entries entries each.
+
+    Returns (first_day, last_day, num_posts, num_reels) tuples; posts and
+    reels are shared out evenly so each chunk asks for the same mix.
+    """
+    first_day, last_day = month_bounds(target_month)
+    days = (last_day - first_day).days + 1
+    count = min(days, max(1, -(-(num_posts + num_reels) // max(1, chunk_entries))))
+    chunks = []
+    for i in range(count):
+        posts = num_posts * (i + 1) // count - num_posts * i // count
+        reels = num_reels * (i + 1) // count - num_reels * i // count
+        if posts + reels:
+            chunks.append((
+                first_day + timedelta(days=days * i // count),
+                first_day + timedelta(days=days * (i + 1) // count - 1),
+                posts,
+                reels
+            ))
+    return chunks
+
+def bulk_months_from(items):
+    """Expand bulk generation items into one settings dict per (client, month). Raises ValueError."""
+    months = []
+    seen = set()
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("each item must be an object")
+        client = item.get('client')
+        client_data = storage.get_client(client) if isinstance(client, str) else None
+        if client_data is None:
+            raise ValueError(f"unknown client {client!r}")
+        if client_data.get('status') == 'generating':
+            raise ValueError(f"{client} is still being generated")
+        first = item.get('from') or item.get('month')
+        last = item.get('to') or first
+        for value in (first, last):
+            if not isinstance(value, str) or not re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])', value):
+                raise ValueError(f"months for {client} must be in YYYY-MM format")
+        if last < first:
+            raise ValueError(f"'to' is before 'from' for {client}")
+        # Per-item settings override the ones the client was created with
+        settings = {
+            'numPosts': int(item.get('numPosts', client_data.get('numPosts', 0))),
+            'numReels': int(item.get('numReels', client_data.get('numReels', 0))),
+            'platforms': item.get('platforms', client_data.get('platforms', [])),
+        }
+        if settings['numPosts'] < 0 or settings['numReels'] < 0 or settings['numPosts'] + settings['numReels'] == 0:
+            raise ValueError(f"{client} needs at least one post or reel per month")
+        # Overlapping items would generate the same month twice
+        for month in month_range(first, last):
+            if (client, month) not in seen:
+                seen.add((client, month))
+                months.append(dict(settings, client=client, month=month))
+    return months
+
+@app.route('/calendars/bulk', methods=['POST'])
+def bulk_generate_calendars():
+    """Queue calendar generation for many clients and months as one resumable job.
+
+    Body: {"items": [{"client": ..., "from": "YYYY-MM", "to": "YYYY-MM"}, ...], "regenerate": false}
+    Items may override numPosts, numReels and platforms. Generated months
+    replace the client's entries for that month; other months are kept.
+    """
+    if not check_auth():
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+    body = request.get_json(silent=True) or {}
+    items = body.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "error": "items must be a non-empty list"}), 400
+    try:
+        months = bulk_months_from(items)
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": f"Invalid item: {str(e)}"}), 400
+    if len(months) > app.config['BULK_GENERATION_MAX_MONTHS']:
+        return jsonify({"success": False, "error": f"At most {app.config['BULK_GENERATION_MAX_MONTHS']} client months per batch"}), 413
+    
+    job_id = job_queue.submit('bulk_calendar', {'months': months, 'regenerate': bool(body.get('regenerate'))})
+    job_queue.add_event(job_id, {'type': 'batch', 'total': len(months)})
+    return jsonify({"success": True, "job_id": job_id, "months": len(months)}), 202
+
+def bulk_progress(job_id):
+    """Summarize a bulk job's month events; a later event for the same month replaces an earlier one."""
+    total = 0
+    months = {}
+    for _, data in job_queue.events(job_id):
+        if data.get('type') == 'batch':
+            total = data['total']
+        elif data.get('type') == 'month':
+            months[(data['client'], data['month'])] = data
+    done = [data for data in months.values() if data['status'] == 'done']
+    failed = [data for data in months.values() if data['status'] == 'failed']
+    return {
+        'total': total,
+        'completed': len(done),
+        'failed': [{'client': d['client'], 'month': d['month'], 'error': d.get('error')} for d in failed],
+        'remaining': total - len(done),
+    }
+
+@app.route('/calendars/bulk/<job_id>')
+def bulk_calendar_status(job_id):
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    job = job_queue.get(job_id)
+    if job is None or job['kind'] != 'bulk_calendar':
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(dict(job, progress=bulk_progress(job_id)))
+
+@app.route('/calendars/bulk/<job_id>/resume', methods=['POST'])
+def resume_bulk_calendars(job_id):
+    """Run a failed batch again; months that were already generated are skipped."""
+    if not check_auth():
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+    job = job_queue.get(job_id)
+    if job is None or job['kind'] != 'bulk_calendar':
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    if not job_queue.retry(job_id):
+        return jsonify({"success": False, "error": f"Only failed batches can be resumed (status: {job['status']})"}), 409
+    return jsonify({"success": True, "job_id": job_id}), 202
+
+@job_queue.register('bulk_calendar')
+def run_bulk_calendar_job(payload, job_id):
+    """Generate every pending (client, month) of a batch, chunked and in parallel.
+
+    A month is merged into the client's calendar once all of its chunks
+    succeed, then recorded as a 'month' event. Those events let a resumed
+    or re-claimed job skip months that are already done.
+    """
+    done = {(data['client'], data['month']) for _, data in job_queue.events(job_id)
+            if data.get('type') == 'month' and data['status'] == 'done'}
+    months = [m for m in payload['months'] if (m['client'], m['month']) not in done]
+    chunks = [(index, chunk) for index, m in enumerate(months)
+              for chunk in calendar_chunks(m['month'], m['numPosts'], m['numReels'], app.config['CALENDAR_CHUNK_ENTRIES'])]
+    remaining = [0] * len(months)
+    for index, _ in chunks:
+        remaining[index] += 1
+    generated = [[] for _ in months]
+    errors = [None] * len(months)
+    
+    def generate_chunk(task):
+        index, (first_day, last_day, num_posts, num_reels) = task
+        m = months[index]
+        content_calendar = generate_content_calendar(
+            m['client'], '', '', '', m['month'], m['platforms'], num_posts, num_reels,
+            regenerate=payload.get('regenerate', False),
+            date_range=(first_day, last_day)
+        )
+        if not content_calendar:
+            raise RuntimeError("Failed to generate content calendar")
+        return json.loads(content_calendar)
+    
+    def finish_month(index):
+        m = months[index]
+        event = {'type': 'month', 'client': m['client'], 'month': m['month']}
+        if errors[index] is None and storage.get_client(m['client']) is None:
+            errors[index] = "Client was deleted"
+        if errors[index] is None:
+            # Copy a legacy client's generated calendar into its entries before merging
+            get_project_calendar(m['client'])
+            entries = sorted(generated[index], key=lambda entry: entry['date'])
+            added, skipped = storage.merge_month(m['client'], m['month'], [to_calendar_entry(entry) for entry in entries])
+            invalidate_calendar(m['client'])
+            event.update(status='done', entries=added, skipped=skipped)
+        else:
+            event.update(status='failed', error=errors[index])
+        job_queue.add_event(job_id, event)
+    
+    for position, result, error in imap_bounded(
+        generate_chunk, chunks,
+        max_workers=app.config['BULK_GENERATION_WORKERS'],
+        timeout=app.config['BULK_GENERATION_TIMEOUT']
+    ):
+        index = chunks[position][0]
+        if error is not None:
+            app.logger.error(f"Bulk generation for {months[index]['client']} {months[index]['month']} failed: {str(error)}")
+            errors[index] = errors[index] or str(error)
+        else:
+            generated[index].extend(result)
+        remaining[index] -= 1
+        if remaining[index] == 0:
+            finish_month(index)
+        job_queue.extend_lease(job_id)
+    
+    failed = sum(1 for error in errors if error)
+    if failed:
+        raise RuntimeError(f"{failed} of {len(payload['months'])} months failed; resume the batch to retry them")
+    return {"months": len(payload['months']), "generated": len(months), "skipped": len(done)}
+
+# Bump when the mapping from generated calendars to calendar entries changes
+CALENDAR_VERSION = 1
+
+# Per-process LRU cache of project calendars: project -> (storage revision, project data)
+calendar_cache = OrderedDict()
+calendar_cache_counts = {'hits': 0, 'misses': 0}
+calendar_cache_lock = threading.Lock()
+
+def calendar_cache_stats():
+    lookups = calendar_cache_counts['hits'] + calendar_cache_counts['misses']
+    return dict(
+        calendar_cache_counts,
+        entries=len(calendar_cache),
+        hit_ratio=calendar_cache_counts['hits'] / lookups if lookups else 0.0
+    )
+
+def to_calendar_entry(entry):
+    """Create a dashboard calendar entry from a generated calendar entry."""
+    return {
+        'date': entry['date'],
+        'day': datetime.strptime(entry['date'], '%Y-%m-%d').strftime('%A'),
+        'content_type': entry['content_type'],
+        'channel': entry['platform'],
+        'status': 'pending',
+        'text_content': f"{entry['topic']}\n{entry['description']}",
+        'approval': 'pending',
+        'hashtags': entry['hashtags'],  # Add hashtags separately
+        'call_to_action': entry['call_to_action'],  # Add call-to-action separately
+        'references': f"Hashtags: {entry['hashtags']}\nCall to Action: {entry['call_to_action']}"
+    }
+
+def build_calendar_entries(content_calendar):
+    """Turn a generated calendar (JSON string) into dashboard calendar entries."""
+    return [to_calendar_entry(entry) for entry in json.loads(content_calendar)]
+
+def get_project_calendar(project):
+    """Return a project's calendar data without writing to storage on the read path.
+
+    Clients created before calendars were materialized at creation time get
+    their generated calendar copied into calendar_entries once, on first read.
+    The returned dict is shared with the cache and must not be mutated.
+    """
+    revision = storage.get_revision(project)
+    with calendar_cache_lock:
+        cached = calendar_cache.get(project)
+        if cached and revision is not None and cached[0] == revision:
+            calendar_cache.move_to_end(project)
+            calendar_cache_counts['hits'] += 1
+            return cached[1]
+        calendar_cache_counts['misses'] += 1
+    
+    project_data = storage.get_project(project) or {"calendar_entries": []}
+    if project_data.get('calendar_version') != CALENDAR_VERSION:
+        client_data = storage.get_client(project)
+        if client_data and 'contentCalendar' in client_data:
+            entries = build_calendar_entries(client_data['contentCalendar'])
+            storage.materialize_calendar(project, entries, CALENDAR_VERSION)
+            project_data = storage.get_project(project)
+            revision = storage.get_revision(project)
+    
+    with calendar_cache_lock:
+        calendar_cache[project] = (revision, project_data)
+        calendar_cache.move_to_end(project)
+        while len(calendar_cache) > app.config['CALENDAR_MEMORY_CACHE_SIZE']:
+            calendar_cache.popitem(last=False)
+    return project_data
+
+def invalidate_calendar(project):
+    with calendar_cache_lock:
+        calendar_cache.pop(project, None)
+
 @app.route('/get_calendar_data/<project>')
 def get_calendar_data(project):
     if not check_auth():
         return jsonify({"error": "Unauthorized"}), 401
-    data = load_data()
-    
-    # Get project data
-    project_data = data['projects'].get(project, {"calendar_entries": []})
     
-    # Get client data if it exists
-    client_data = data['clients'].get(project)
-    if client_data and 'contentCalendar' in client_data:
-        try:
-            # Parse the content calendar JSON
-            calendar_data = json.loads(client_data['contentCalendar'])
-            entries = []
-            
-            for entry in calendar_data:
-                # Create a calendar entry with the parsed data
-                calendar_entry = {
-                    'date': entry['date'],
-                    'day': datetime.strptime(entry['date'], '%Y-%m-%d').strftime('%A'),
-                    'content_type': entry['content_type'],
-                    'channel': entry['platform'],
-                    'status': 'pending',
-                    'text_content': f"{entry['topic']}\n{entry['description']}",
-                    'approval': 'pending',
-                    'hashtags': entry['hashtags'],  # Add hashtags separately
-                    'call_to_action': entry['call_to_action'],  # Add call-to-action separately
-                    'references': f"Hashtags: {entry['hashtags']}\nCall to Action: {entry['call_to_action']}"
-                }
-                entries.append(calendar_entry)
-            
-            # Add these entries to the project data
-            project_data['calendar_entries'] = entries
-            save_data(data)
-            
-        except json.JSONDecodeError as e:
-            app.logger.error(f"Error parsing calendar JSON: {str(e)}")
-            return jsonify({"error": "Invalid calendar data format"}), 400
-        except Exception as e:
-            app.logger.error(f"Error processing calendar data: {str(e)}")
-            return jsonify({"error": str(e)}), 500
+    try:
+        project_data = get_project_calendar(project)
+    except json.JSONDecodeError as e:
+        app.logger.error(f"Error parsing calendar JSON: {str(e)}")
+        return jsonify({"error": "Invalid calendar data format"}), 400
+    except Exception as e:
+        app.logger.error(f"Error processing calendar data: {str(e)}")
+        return jsonify({"error": str(e)}), 500
     
     return jsonify(project_data)
 
+@app.route('/export/<fmt>')
+def export_calendar(fmt):
+    """Stream calendar entries across projects as CSV, iCalendar or XLSX.
+
+    Filters: project (repeatable; all projects if omitted), month (YYYY-MM),
+    channel and status. Rows come from a storage generator, so memory use
+    stays flat however many clients are exported.
+    """
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    if fmt not in exports.EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported export format: {fmt}"}), 404
+    if fmt == 'xlsx' and not exports.xlsx_available():
+        return jsonify({"error": "XLSX export requires the XlsxWriter package"}), 501
+    
+    projects = request.args.getlist('project') or None
+    month = request.args.get('month') or None
+    if month and not re.fullmatch(r'\d{4}-\d{2}', month):
+        return jsonify({"error": "month must be in YYYY-MM format"}), 400
+    
+    writer, mimetype, extension = exports.EXPORT_FORMATS[fmt]
+    rows = storage.iter_entries(
+        projects=projects,
+        month=month,
+        channel=request.args.get('channel') or None,
+        status=request.args.get('status') or None
+    )
+    name = projects[0] if projects and len(projects) == 1 else 'calendars'
+    filename = secure_filename(f"{name}_{month or datetime.now().strftime('%Y-%m-%d')}.{extension}") or f"calendar.{extension}"
+    
+    response = Response(stream_with_context(writer(rows)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@app.route('/search')
+def search_entries():
+    """Search calendar entries across all clients, with facet counts.
+
+    Query: q (words matched against text, hashtags, call to action,
+    channel, content type, status and approval; word* matches a prefix),
+    project (repeatable), month (YYYY-MM), channel, content_type, status,
+    approval, page and per_page.
+    """
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 50))
+    except ValueError:
+        return jsonify({"error": "page and per_page must be numbers"}), 400
+    if page < 1 or not 1 <= per_page <= app.config['SEARCH_PAGE_LIMIT']:
+        return jsonify({"error": f"page must be at least 1 and per_page between 1 and {app.config['SEARCH_PAGE_LIMIT']}"}), 400
+    month = request.args.get('month') or None
+    if month and not re.fullmatch(r'\d{4}-\d{2}', month):
+        return jsonify({"error": "month must be in YYYY-MM format"}), 400
+    filters = {field: request.args[field] for field in SEARCH_FACETS[1:] if request.args.get(field)}
+    
+    started = time.perf_counter()
+    found = storage.search_entries(
+        text=request.args.get('q'),
+        projects=request.args.getlist('project') or None,
+        limit=per_page,
+        offset=(page - 1) * per_page,
+        **filters
+    )
+    return jsonify({
+        "total": found['total'],
+        "page": page,
+        "per_page": per_page,
+        "entries": [dict(entry, project=project) for project, entry in found['results']],
+        "facets": {
+            facet: [{"value": value, "count": count} for value, count in counts]
+            for facet, counts in found['facets'].items()
+        },
+        "took_ms": round((time.perf_counter() - started) * 1000, 2)
+    })
+
 @app.route('/add_entry', methods=['POST'])
 def add_entry():
     if not check_auth():
         return jsonify({"error": "Unauthorized"}), 401
-    data = load_data()
     entry = request.json
     project = entry['project']
     
-    if project not in data['projects']:
-        data['projects'][project] = {"calendar_entries": []}
-    
-    data['projects'][project]['calendar_entries'].append({
+    storage.add_entry(project, {
         'date': entry['date'],
         'day': entry['day'],
         'content_type': entry['content_type'],
@@ -424,33 +1355,33 @@ def add_entry():
         'approval': entry['approval'],
         'references': entry['references']
     })
+    invalidate_calendar(project)
     
-    save_data(data)
     return jsonify({"success": True})
 
 @app.route('/update_entry', methods=['POST'])
 def update_entry():
     if not check_auth():
         return jsonify({"error": "Unauthorized"}), 401
-    data = load_data()
     entry = request.json
     project = entry['project']
     index = entry['index']
     
-    if project in data['projects']:
-        if 0 <= index < len(data['projects'][project]['calendar_entries']):
-            data['projects'][project]['calendar_entries'][index] = {
-                'date': entry['date'],
-                'day': entry['day'],
-                'content_type': entry['content_type'],
-                'channel': entry['channel'],
-                'status': entry['status'],
-                'text_content': entry['text_content'],
-                'approval': entry['approval'],
-                'references': entry['references']
-            }
-            save_data(data)
-            return jsonify({"success": True})
+    previous = storage.update_entry(project, index, {
+        'date': entry['date'],
+        'day': entry['day'],
+        'content_type': entry['content_type'],
+        'channel': entry['channel'],
+        'status': entry['status'],
+        'text_content': entry['text_content'],
+        'approval': entry['approval'],
+        'references': entry['references']
+    })
+    if previous is not None:
+        invalidate_calendar(project)
+        # Drop the preview generated for the old version of this entry
+        preview_cache.delete(preview_cache_key(project, previous))
+        return jsonify({"success": True})
     
     return jsonify({"success": False})
 
@@ -458,25 +1389,196 @@ def update_entry():
 def delete_entry():
     if not check_auth():
         return jsonify({"error": "Unauthorized"}), 401
-    data = load_data()
     entry = request.json
     project = entry['project']
     index = entry['index']
     
-    if project in data['projects']:
-        if 0 <= index < len(data['projects'][project]['calendar_entries']):
-            del data['projects'][project]['calendar_entries'][index]
-            save_data(data)
-            return jsonify({"success": True})
+    if storage.delete_entry(project, index) is not None:
+        invalidate_calendar(project)
+        return jsonify({"success": True})
     
     return jsonify({"success": False})
 
+# Fields a client may change on an entry
+ENTRY_FIELDS = (
+    'date', 'day', 'content_type', 'channel', 'status', 'text_content',
+    'hashtags', 'call_to_action', 'approval', 'references'
+)
+
+def parse_entry_version(value):
+    """Read an entry version from an If-Match value ("3" or W/"3") or a JSON number."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('W/'):
+            value = value[2:]
+        value = value.strip('"')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid entry version: {value}")
+
+def entry_fields_from(payload):
+    """Validate the changed fields of a PATCH request."""
+    if not isinstance(payload, dict):
+        raise ValueError("Expected a JSON object of changed fields")
+    unknown = set(payload) - set(ENTRY_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown entry fields: {', '.join(sorted(unknown))}")
+    return payload
+
+def entry_response(entry, status=200, **extra):
+    response = jsonify(dict(extra, entry=entry))
+    response.status_code = status
+    response.set_etag(str(entry['version']))
+    return response
+
+def after_entries_changed(results):
+    """Invalidate calendars and previews affected by (project, previous, updated) changes."""
+    for project, previous, updated in results:
+        invalidate_calendar(project)
+        if preview_cache_key(project, previous) != preview_cache_key(project, updated):
+            preview_cache.delete(preview_cache_key(project, previous))
+
+@app.route('/entries/<entry_id>', methods=['PATCH'])
+def patch_entry(entry_id):
+    """Change some fields of an entry. The expected version goes in If-Match (or a version field)."""
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    payload = dict(request.get_json(silent=True) or {})
+    try:
+        version = parse_entry_version(request.headers.get('If-Match') or payload.pop('version', None))
+        fields = entry_fields_from(payload)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if version is None:
+        return jsonify({"success": False, "error": "An If-Match header or version is required"}), 428
+    
+    try:
+        results = storage.patch_entries([(entry_id, version, fields)])
+    except EntryNotFound:
+        return jsonify({"success": False, "error": "Entry not found"}), 404
+    except VersionConflict as e:
+        return entry_response(e.entry, 409, success=False, error="Entry was changed by someone else")
+    
+    after_entries_changed(results)
+    return entry_response(results[0][2], success=True)
+
+@app.route('/entries/<entry_id>', methods=['DELETE'])
+def remove_entry(entry_id):
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        version = parse_entry_version(request.headers.get('If-Match') or request.args.get('version'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if version is None:
+        return jsonify({"success": False, "error": "An If-Match header or version is required"}), 428
+    
+    try:
+        project, removed = storage.remove_entry(entry_id, version)
+    except EntryNotFound:
+        return jsonify({"success": False, "error": "Entry not found"}), 404
+    except VersionConflict as e:
+        return entry_response(e.entry, 409, success=False, error="Entry was changed by someone else")
+    
+    invalidate_calendar(project)
+    return jsonify({"success": True})
+
+@app.route('/entries/bulk', methods=['POST'])
+def bulk_update_entries():
+    """Apply many entry changes in one transaction; any conflict rejects them all.
+
+    Body: {"changes": [{"id": ..., "version": ..., "fields": {...}}, ...]}
+    """
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    changes = (request.get_json(silent=True) or {}).get('changes')
+    if not isinstance(changes, list) or not changes:
+        return jsonify({"success": False, "error": "changes must be a non-empty list"}), 400
+    if len(changes) > app.config['ENTRY_BULK_LIMIT']:
+        return jsonify({"success": False, "error": f"At most {app.config['ENTRY_BULK_LIMIT']} changes per request"}), 413
+    
+    try:
+        parsed = []
+        for change in changes:
+            version = parse_entry_version(change.get('version'))
+            if version is None:
+                raise ValueError(f"Change for entry {change.get('id')} has no version")
+            parsed.append((change['id'], version, entry_fields_from(change.get('fields'))))
+    except (AttributeError, KeyError, ValueError) as e:
+        return jsonify({"success": False, "error": f"Invalid change: {str(e)}"}), 400
+    
+    try:
+        results = storage.patch_entries(parsed)
+    except EntryNotFound as e:
+        return jsonify({"success": False, "error": f"Entry not found: {e.args[0]}"}), 404
+    except VersionConflict as e:
+        return jsonify({"success": False, "error": "Entry was changed by someone else", "conflict": e.entry}), 409
+    
+    after_entries_changed(results)
+    return jsonify({"success": True, "entries": [updated for _, _, updated in results]})
+
 @app.route('/dashboard')
 def dashboard():
     if not check_auth():
         return redirect(url_for('login'))
-    data = load_data()
-    return render_template('index.html', projects=list(data['clients'].keys()))
+    return render_template('index.html', projects=storage.client_names(), generating=storage.generating_clients())
+
+def cache_samples(field):
+    caches = {
+        'preview': preview_cache.stats(),
+        'render': rendered_cache.stats(),
+        'variant': variant_cache.stats(),
+        'insight': insight_cache.stats(),
+        'calendar_response': calendar_response_cache.stats(),
+        'calendar': calendar_cache_stats(),
+    }
+    return [((name,), stats[field]) for name, stats in caches.items()]
+
+def gateway_samples():
+    stats = gateway.stats()
+    return [((event,), value) for event, value in stats.items() if isinstance(value, int)]
+
+metrics_registry.callback('cache_hits_total', 'Cache lookups that found an entry', 'counter', ('cache',),
+                          lambda: cache_samples('hits'))
+metrics_registry.callback('cache_misses_total', 'Cache lookups that missed', 'counter', ('cache',),
+                          lambda: cache_samples('misses'))
+metrics_registry.callback('cache_hit_ratio', 'Share of cache lookups that hit', 'gauge', ('cache',),
+                          lambda: cache_samples('hit_ratio'))
+metrics_registry.callback('gemini_gateway_events', 'Gemini gateway counters and breaker state', 'gauge', ('event',),
+                          gateway_samples)
+metrics_registry.callback('gemini_circuit_open', '1 while the Gemini circuit breaker is open', 'gauge', (),
+                          lambda: [((), 1 if gateway.breaker.is_open else 0)])
+metrics_registry.callback('single_flight_calls_total', 'Model calls made (led), shared with a concurrent caller, or taken over from an expired lease', 'counter', ('outcome',),
+                          lambda: [((outcome,), value) for outcome, value in single_flight.stats().items()])
+metrics_registry.callback('log_records_dropped_total', 'Log records dropped because the log queue was full', 'counter', (),
+                          lambda: [((), log_handler.dropped if log_handler else 0)])
+
+# Each worker publishes its metrics to the job database, so one scrape covers every worker
+shared_metrics = SharedMetrics(
+    metrics_registry,
+    os.environ.get('JOBS_DATABASE_PATH', 'jobs.db'),
+    publish_interval=float(os.environ.get('METRICS_PUBLISH_INTERVAL', 5))
+)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for all worker processes sharing the job database."""
+    token = app.config['METRICS_TOKEN']
+    if token:
+        if not secrets.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            return jsonify({"error": "Unauthorized"}), 401
+    elif not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    return Response(shared_metrics.render(), content_type=Registry.CONTENT_TYPE)
+
+@app.route('/gateway/stats')
+def gateway_stats():
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(gateway.stats())
 
 @app.route('/test_gemini')
 def test_gemini():
@@ -498,123 +1600,373 @@ def test_gemini():
             "error": str(e)
         }), 500
 
-def generate_preview_image(text_content, content_type, client_name, hashtags, call_to_action):
-    """Generate a preview image using Gemini."""
-    try:
-        # Create prompt for image generation
-        prompt = f"""Create a professional social media advertisement image with the following specifications:
+def preview_image_request(client_name, text_content):
+    """Keyword arguments for the Gemini call that draws a post's preview image."""
+    # Create prompt for image generation
+    prompt = f"""Create a professional social media advertisement image with the following specifications:
         - Brand: {client_name}
         - Main Text: '{text_content}'
         - Style: Modern and appetizing
         - Colors: Warm tones with red and orange
         - Include: Professional product image with visual elements
         """
-        
-        app.logger.info(f"Generating image with prompt: {prompt}")
-        
-        # Generate image using Gemini
-        response = client.models.generate_content(
-            model=IMAGE_MODEL_ID,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_modalities=['Text', 'Image']
-            )
+    
+    # Only summaries are logged: prompts are long and responses carry the image bytes
+    if app.logger.isEnabledFor(logging.DEBUG):
+        app.logger.debug(
+            f"Generating preview image for {client_name}",
+            extra={'fields': {'client': client_name, 'prompt': summarize_payload(prompt)}}
         )
-        app.logger.info(f"Got response from Gemini: {response}")
-        
-        # Extract image from response
-        if hasattr(response, 'candidates') and response.candidates:
-            app.logger.info(f"Response has candidates")
-            for part in response.candidates[0].content.parts:
-                app.logger.info(f"Checking part: {part}")
-                if hasattr(part, 'inline_data') and part.inline_data is not None:
-                    app.logger.info("Found image data in response")
-                    # Convert image data to bytes
-                    img_data = part.inline_data.data
-                    img_bytes = bytes(img_data)
-                    
-                    # Create a BytesIO object
-                    img_buffer = BytesIO(img_bytes)
-                    
-                    # Return the image buffer
-                    return img_buffer
-        else:
-            app.logger.error("No candidates found in response")
-                
-        app.logger.error("No image generated in response")
-        return None
-        
+    return {
+        'model': IMAGE_MODEL_ID,
+        'contents': prompt,
+        'config': genai_types().GenerateContentConfig(response_modalities=['Text', 'Image'])
+    }
+
+def preview_image_from_response(response, client_name):
+    """Return the image in a Gemini response as a BytesIO buffer, or None if it has none."""
+    if app.logger.isEnabledFor(logging.DEBUG):
+        app.logger.debug(
+            f"Gemini image response for {client_name}",
+            extra={'fields': {'client': client_name, 'response': summarize_payload(response)}}
+        )
+    
+    # Extract image from response
+    if hasattr(response, 'candidates') and response.candidates:
+        for part in response.candidates[0].content.parts:
+            if hasattr(part, 'inline_data') and part.inline_data is not None:
+                # Convert image data to bytes
+                img_bytes = bytes(part.inline_data.data)
+                app.logger.info(
+                    f"Generated preview image for {client_name} ({len(img_bytes)} bytes)",
+                    extra={'fields': {'client': client_name, 'image': summarize_payload(img_bytes)}}
+                )
+                return BytesIO(img_bytes)
+    else:
+        app.logger.error("No candidates found in response")
+    
+    app.logger.error("No image generated in response")
+    return None
+
+def generate_preview_image(text_content, content_type, client_name, hashtags, call_to_action):
+    """Generate a preview image using Gemini."""
+    try:
+        response = gateway.generate_content(**preview_image_request(client_name, text_content))
+        return preview_image_from_response(response, client_name)
     except Exception as e:
         app.logger.error(f"Error generating preview image: {str(e)}")
         return None
 
+def preview_cache_key(client_name, post):
+    """Hash the inputs that determine a post's preview image."""
+    return DiskCache.make_key(
+        post.get('text_content', ''),
+        post.get('content_type', ''),
+        client_name,
+        post.get('hashtags', ''),
+        post.get('call_to_action', '')
+    )
+
+def ensure_variant(key, path, width, fmt):
+    """Return (variant key, path, mtime) of a resized variant of a cached image, creating it once."""
+    variant_key = DiskCache.make_key('variant', key, width, fmt)
+    cached = variant_cache.lookup(variant_key)
+    if cached:
+        return (variant_key,) + cached
+    with open(path, 'rb') as f:
+        data = thumbnails.make_variant(f.read(), width, fmt)
+    variant_path = variant_cache.set(variant_key, data)
+    return variant_key, variant_path, os.path.getmtime(variant_path)
+
+def send_cached_preview(key, path, mtime):
+    """Serve a cached preview with validators so browsers can revalidate cheaply.
+
+    ?w= (pixels) and ?fmt= (webp or jpeg) select a resized variant; with
+    only w the format follows the Accept header. A URL whose v parameter
+    is the current key always names the same bytes, so it may be cached
+    for good.
+    """
+    immutable = request.args.get('v') == key
+    mimetype = 'image/png'
+    negotiated = False
+    if request.args.get('w') or request.args.get('fmt'):
+        width = request.args.get('w') or str(thumbnails.WIDTHS[-1])
+        if not width.isdigit() or int(width) == 0:
+            return jsonify({"error": "w must be a positive number of pixels"}), 400
+        try:
+            fmt, negotiated = thumbnails.negotiate_format(request.args.get('fmt'), request.accept_mimetypes)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        key, path, mtime = ensure_variant(key, path, thumbnails.snap_width(int(width)), fmt)
+        mimetype = thumbnails.FORMATS[fmt][1]
+    
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        as_attachment=False,
+        download_name=f"preview.{mimetype.split('/')[1]}",
+        etag=key,
+        last_modified=mtime,
+        conditional=True
+    )
+    response.cache_control.private = True
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    else:
+        # The URL is index based, so always revalidate against the ETag
+        response.cache_control.no_cache = True
+    if negotiated:
+        response.vary.add('Accept')
+    return response
+
+def ensure_preview(client_name, post):
+    """Return (key, path, mtime) of the post's cached preview, generating it on a miss."""
+    key = preview_cache_key(client_name, post)
+    cached = preview_cache.lookup(key)
+    if cached:
+        return (key,) + cached
+    
+    def generate():
+        app.logger.info(
+            f"Generating preview {key} for {client_name}",
+            extra={'fields': {'client': client_name, 'entry_id': post.get('id'), 'date': post.get('date')}}
+        )
+        img_buffer = generate_preview_image(
+            post['text_content'],
+            post['content_type'],
+            client_name,
+            post.get('hashtags', ''),
+            post.get('call_to_action', '')
+        )
+        if img_buffer is None:
+            return None
+        path = preview_cache.set(key, img_buffer.getvalue())
+        return path, os.path.getmtime(path)
+    
+    # Other tabs and workers asking for the same preview meanwhile wait for this call and read the cache
+    found = single_flight.do(f"preview:{key}", generate, lookup=lambda: preview_cache.lookup(key))
+    return (key,) + found if found else None
+
+def render_cache_key(client_name, post, brand, size):
+    return DiskCache.make_key('render', render.RENDER_VERSION, size, brand, preview_cache_key(client_name, post))
+
+def ensure_render(client_name, post, brand, size):
+    """Return (key, path, mtime) of the post's local render, compositing it on a miss."""
+    key = render_cache_key(client_name, post, brand, size)
+    cached = rendered_cache.lookup(key)
+    if cached:
+        return (key,) + cached
+    path = rendered_cache.set(key, render.render_preview(post, client_name, brand, size))
+    return key, path, os.path.getmtime(path)
+
+@app.route('/render/<client_name>/<int:index>')
+def render_preview(client_name, index):
+    """Serve a preview composited from the client's brand template, in milliseconds and without Gemini."""
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    size = request.args.get('size', 'full')
+    if size not in render.SIZES:
+        return jsonify({"error": f"size must be one of {', '.join(render.SIZES)}"}), 400
+    entries = get_project_calendar(client_name).get('calendar_entries', [])
+    if not 0 <= index < len(entries):
+        return "Post not found", 404
+    brand = render.brand_for(storage.get_client(client_name))
+    return send_cached_preview(*ensure_render(client_name, entries[index], brand, size))
+
+@app.route('/clients/<client_name>/brand', methods=['GET', 'POST'])
+def client_brand(client_name):
+    """Read or update a client's brand template: colors (#RRGGBB), a logo image and a TrueType font."""
+    if not check_auth():
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+    client_data = storage.get_client(client_name)
+    if client_data is None:
+        return jsonify({"success": False, "error": "Client not found"}), 404
+    if request.method == 'GET':
+        return jsonify({"success": True, "brand": render.brand_for(client_data)})
+    
+    fields = request.get_json(silent=True) or request.form
+    brand = dict(client_data.get('brand') or {})
+    for name in ('primary', 'secondary', 'text'):
+        value = fields.get(name)
+        if value:
+            if not re.fullmatch(r'#[0-9a-fA-F]{6}', value):
+                return jsonify({"success": False, "error": f"{name} must be a color like #c0392b"}), 400
+            brand[name] = value.lower()
+    
+    # Assets are named by content hash, so a new upload changes the brand and with it the render cache keys
+    asset_dir = os.path.join(app.config['BRAND_ASSETS_DIR'], hashlib.sha256(client_name.encode('utf-8')).hexdigest()[:16])
+    try:
+        logo = request.files.get('logo')
+        if logo and logo.filename:
+            from PIL import Image
+            with Image.open(logo.stream) as img:
+                img = img.convert('RGBA')
+                img.thumbnail((512, 512))
+                buffer = BytesIO()
+                img.save(buffer, format='PNG')
+            data = buffer.getvalue()
+            os.makedirs(asset_dir, exist_ok=True)
+            brand['logo'] = os.path.join(asset_dir, f"logo-{hashlib.sha256(data).hexdigest()[:12]}.png")
+            with open(brand['logo'], 'wb') as f:
+                f.write(data)
+        font = request.files.get('font')
+        if font and font.filename:
+            from PIL import ImageFont
+            data = font.read()
+            ImageFont.truetype(BytesIO(data), 12)  # Rejects anything that isn't a usable font
+            os.makedirs(asset_dir, exist_ok=True)
+            brand['font'] = os.path.join(asset_dir, f"font-{hashlib.sha256(data).hexdigest()[:12]}.ttf")
+            with open(brand['font'], 'wb') as f:
+                f.write(data)
+    except OSError as e:
+        return jsonify({"success": False, "error": f"Invalid logo or font: {str(e)}"}), 400
+    
+    client_data['brand'] = brand
+    storage.put_client(client_name, client_data)
+    return jsonify({"success": True, "brand": render.brand_for(client_data)})
+
 @app.route('/preview/<client_name>/<int:index>')
 def preview_image(client_name, index):
     """Generate and display a preview image for a specific post."""
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+
     try:
         # Get calendar data
-        calendar_response = get_calendar_data(client_name)
-        calendar_data = calendar_response.get_json()  # Convert response to JSON
+        calendar_data = get_project_calendar(client_name)
         
         if not calendar_data or 'calendar_entries' not in calendar_data or index >= len(calendar_data['calendar_entries']):
             app.logger.error("Post not found in calendar data")
             return "Post not found", 404
             
-        post = calendar_data['calendar_entries'][index]
-        app.logger.info(f"Generating preview for post: {post}")
-        
-        # Generate preview image
-        img_buffer = generate_preview_image(
-            post['text_content'],
-            post['content_type'],
-            client_name,
-            post.get('hashtags', ''),
-            post.get('call_to_action', '')
-        )
-        
-        if img_buffer is None:
+        preview = ensure_preview(client_name, calendar_data['calendar_entries'][index])
+        if preview is None:
             app.logger.error("Failed to generate image")
+            if gateway.breaker.is_open:
+                # Gemini is unhealthy; answer quickly with the local render instead of an error
+                brand = render.brand_for(storage.get_client(client_name))
+                return send_cached_preview(*ensure_render(client_name, calendar_data['calendar_entries'][index], brand, 'full'))
             return "Failed to generate image", 404
-            
-        # Reset buffer position to beginning
-        img_buffer.seek(0)
         
-        # Return the image with proper headers
-        return send_file(
-            img_buffer,
-            mimetype='image/png',
-            as_attachment=False,
-            download_name='preview.png'
-        )
+        return send_cached_preview(*preview)
         
     except Exception as e:
         app.logger.error(f"Error in preview_image: {str(e)}")
         return "Error generating preview", 500
 
+def sse_event(data, event=None, event_id=None):
+    message = f"data: {json.dumps(data)}\n\n"
+    if event:
+        message = f"event: {event}\n{message}"
+    if event_id is not None:
+        message = f"id: {event_id}\n{message}"
+    return message
+
+@app.route('/previews/<client_name>')
+def stream_previews(client_name):
+    """Stream preview URLs for a set of entries as server-sent events, as each one is ready.
+
+    Cached AI previews are announced immediately. For the rest, the URL of
+    a local render (tier "local") goes out at once and the AI image (tier
+    "ai") follows when its bounded-concurrency generation finishes; pass
+    upgrade=0 to stop at the local render. Each URL carries a cache key so
+    the browser fetches the finished image straight from a cache.
+    """
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    # Load the calendar once for the whole batch
+    entries = get_project_calendar(client_name).get('calendar_entries', [])
+    indices_param = request.args.get('indices')
+    try:
+        if indices_param:
+            indices = [int(i) for i in indices_param.split(',') if i.strip()]
+        else:
+            indices = list(range(len(entries)))
+    except ValueError:
+        return jsonify({"error": "indices must be a comma separated list of integers"}), 400
+    indices = [i for i in dict.fromkeys(indices) if 0 <= i < len(entries)][:app.config['PREVIEW_BATCH_LIMIT']]
+    upgrade = app.config['PREVIEW_AI_UPGRADE'] and request.args.get('upgrade', '1') != '0'
+    brand = render.brand_for(storage.get_client(client_name))
+    
+    grid_width = app.config['PREVIEW_GRID_WIDTH']
+    
+    def preview_url(index, key, **params):
+        return url_for('preview_image', client_name=client_name, index=index, v=key, **params)
+    
+    def render_url(index, size, **params):
+        key = render_cache_key(client_name, entries[index], brand, size)
+        return url_for('render_preview', client_name=client_name, index=index, size=size, v=key, **params)
+    
+    def generate():
+        to_generate = []
+        for index in indices:
+            key = preview_cache_key(client_name, entries[index])
+            if preview_cache.lookup(key):
+                # The grid gets a small variant; the review modal gets the original
+                yield sse_event({
+                    "index": index,
+                    "url": preview_url(index, key, w=grid_width),
+                    "full_url": preview_url(index, key),
+                    "tier": "ai"
+                })
+            else:
+                # Rendered on request in milliseconds; the AI image replaces it when ready
+                yield sse_event({
+                    "index": index,
+                    "url": render_url(index, 'thumb', w=grid_width),
+                    "full_url": render_url(index, 'full'),
+                    "tier": "local"
+                })
+                if upgrade:
+                    to_generate.append(index)
+        
+        results = imap_bounded(
+            lambda index: ensure_preview(client_name, entries[index]),
+            to_generate,
+            max_workers=app.config['PREVIEW_WORKERS'],
+            timeout=app.config['PREVIEW_TIMEOUT']
+        )
+        for position, preview, error in results:
+            index = to_generate[position]
+            if preview is None:
+                if error is not None:
+                    app.logger.error(f"Error generating preview {index} for {client_name}: {str(error)}")
+                yield sse_event({"index": index, "error": "Failed to generate image"})
+            else:
+                yield sse_event({
+                    "index": index,
+                    "url": preview_url(index, preview[0], w=grid_width),
+                    "full_url": preview_url(index, preview[0]),
+                    "tier": "ai"
+                })
+        yield sse_event({"count": len(indices)}, event='done')
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let proxies buffer the stream
+    return response
+
 @app.route('/delete_project', methods=['POST'])
 def delete_project():
     if not check_auth():
         return jsonify({"error": "Unauthorized"}), 401
     
     try:
-        data = load_data()
         project_name = request.json.get('project_name')
     
         if not project_name:
             return jsonify({"success": False, "error": "Project name is required"}), 400
             
         # Delete from both clients and projects
-        if project_name in data['clients']:
-            del data['clients'][project_name]
-        if project_name in data['projects']:
-            del data['projects'][project_name]
-            
-        save_data(data)
+        storage.delete_project(project_name)
+        invalidate_calendar(project_name)
         
         # Return updated project list for frontend
         return jsonify({
             "success": True,
-            "projects": list(data['clients'].keys())
+            "projects": storage.client_names()
         })
         
     except Exception as e:
@@ -624,4 +1976,4 @@ def delete_project():
 if __name__ == '__main__':
     # Set debug mode based on environment
     debug_mode = os.getenv('FLASK_ENV') == 'development'
-    app.run(host='0.0.0.0', port=int(os.getenv('PORT', 5000)), debug=debug_mode)
+    create_app().run(host='0.0.0.0', port=int(os.getenv('PORT', 5000)), debug=debug_mode)
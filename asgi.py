@@ -0,0 +1,156 @@
+"""ASGI entry point: model-bound routes run natively async, everything else is the Flask app.
+
+    uvicorn asgi:application --workers 2
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker --workers 2
+
+GET /preview/<client_name>/<index> and GET /test_gemini wait on Gemini
+through the SDK's async client (gateway.generate_content_async). One
+worker can then keep dozens of generations in flight on its event loop
+and a single connection pool, instead of tying up a thread or process
+for each call. Every other request is passed to the unchanged Flask app,
+which runs on a thread pool. So is a preview response once its image is
+in the cache. Routes, templates and sessions behave the same under
+either server.
+"""
+import asyncio
+import json
+import os
+import re
+from http.cookies import CookieError, SimpleCookie
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+
+import app
+
+app.create_app()
+
+# Threads serving the Flask app; its slow model calls are the ones moved onto the event loop
+flask_app = WSGIMiddleware(app.app, workers=int(os.environ.get('ASGI_WSGI_THREADS', 16)))
+
+
+def is_authenticated(scope):
+    """Read the Flask session cookie, so async routes share the dashboard's login."""
+    cookies = SimpleCookie()
+    try:
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                cookies.load(value.decode('latin-1'))
+    except CookieError:
+        return False
+    morsel = cookies.get(app.app.config['SESSION_COOKIE_NAME'])
+    if morsel is None:
+        return False
+    serializer = app.app.session_interface.get_signing_serializer(app.app)
+    try:
+        session = serializer.loads(morsel.value, max_age=int(app.app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return False
+    return bool(session.get('authenticated', False))
+
+
+async def send_response(send, body, status=200, content_type='text/html; charset=utf-8'):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, data, status=200):
+    await send_response(send, json.dumps(data), status, 'application/json')
+
+
+async def generate_text_async(prompt, config=None):
+    """app.generate_text through the async client."""
+    try:
+        response = await app.gateway.generate_content_async(model=app.TEXT_MODEL_ID, contents=prompt, config=config)
+        return response.text
+    except Exception as e:
+        app.app.logger.error(f"Error generating text: {str(e)}")
+        return None
+
+
+async def generate_preview_image_async(client_name, post):
+    """app.generate_preview_image through the async client."""
+    try:
+        response = await app.gateway.generate_content_async(
+            **app.preview_image_request(client_name, post['text_content'])
+        )
+        return app.preview_image_from_response(response, client_name)
+    except Exception as e:
+        app.app.logger.error(f"Error generating preview image: {str(e)}")
+        return None
+
+
+async def ensure_preview_async(client_name, post):
+    """app.ensure_preview on the event loop. Flights are shared with sync workers generating the same preview."""
+    key = app.preview_cache_key(client_name, post)
+    cached = app.preview_cache.lookup(key)
+    if cached:
+        return (key,) + cached
+
+    async def generate():
+        app.app.logger.info(
+            f"Generating preview {key} for {client_name}",
+            extra={'fields': {'client': client_name, 'entry_id': post.get('id'), 'date': post.get('date')}}
+        )
+        img_buffer = await generate_preview_image_async(client_name, post)
+        if img_buffer is None:
+            return None
+        path = await asyncio.to_thread(app.preview_cache.set, key, img_buffer.getvalue())
+        return path, os.path.getmtime(path)
+
+    found = await app.single_flight.do_async(
+        f"preview:{key}", generate, lookup=lambda: app.preview_cache.lookup(key)
+    )
+    return (key,) + found if found else None
+
+
+async def preview(scope, receive, send, client_name, index):
+    if not is_authenticated(scope):
+        return await send_json(send, {"error": "Unauthorized"}, 401)
+    try:
+        calendar_data = await asyncio.to_thread(app.get_project_calendar, client_name)
+        entries = (calendar_data or {}).get('calendar_entries') or []
+        if int(index) < len(entries):
+            found = await ensure_preview_async(client_name, entries[int(index)])
+            if found is None and not app.gateway.breaker.is_open:
+                app.app.logger.error("Failed to generate image")
+                return await send_response(send, "Failed to generate image", 404)
+    except Exception as e:
+        app.app.logger.error(f"Error in preview_image: {str(e)}")
+        return await send_response(send, "Error generating preview", 500)
+    # Flask answers from the warm cache with its ETag, variant and caching headers,
+    # and handles missing posts and the local render fallback while the breaker is open
+    await flask_app(scope, receive, send)
+
+
+async def test_gemini(scope, receive, send):
+    if not is_authenticated(scope):
+        return await send_json(send, {"error": "Unauthorized"}, 401)
+    response_text = await generate_text_async("Test message: Hello, this is a test of the Gemini API connection.")
+    await send_json(send, {
+        "success": True,
+        "message": "API connection successful!",
+        "test_response": response_text
+    })
+
+
+# (method, path, handler) for the routes served natively async; path groups become handler arguments
+ASYNC_ROUTES = (
+    ('GET', re.compile(r'/preview/(?P<client_name>[^/]+)/(?P<index>\d+)'), preview),
+    ('GET', re.compile(r'/test_gemini'), test_gemini),
+)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        for method, pattern, handler in ASYNC_ROUTES:
+            match = pattern.fullmatch(scope['path'])
+            if match and scope['method'] == method:
+                return await handler(scope, receive, send, **match.groupdict())
+    await flask_app(scope, receive, send)
@@ -0,0 +1,83 @@
+"""Synthetic data.json files for benchmarks.
+
+Usage: python -m bench.datagen --clients 1000 --entries 60 --output data.json
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+
+PLATFORMS = {
+    'Instagram': ['Image', 'Reel', 'Carousel'],
+    'Facebook': ['Image', 'Video', 'Status'],
+    'LinkedIn': ['Article', 'Image', 'Video'],
+}
+STATUSES = ['pending', 'in progress', 'done']
+APPROVALS = ['pending', 'approved', 'rejected']
+WORDS = ('fresh bold seasonal launch offer weekend family crispy spicy classic local deal '
+         'festival limited combo delivery story team customer favourite new').split()
+
+
+def _phrase(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def generate_entry(rng, day):
+    platform = rng.choice(list(PLATFORMS))
+    topic = _phrase(rng, 4)
+    description = _phrase(rng, 12)
+    hashtags = ' '.join(f"#{rng.choice(WORDS)}" for _ in range(5))
+    call_to_action = _phrase(rng, 3)
+    return {
+        'date': day.strftime('%Y-%m-%d'),
+        'day': day.strftime('%A'),
+        'content_type': rng.choice(PLATFORMS[platform]),
+        'channel': platform,
+        'status': rng.choice(STATUSES),
+        'text_content': f"{topic}\n{description}",
+        'approval': rng.choice(APPROVALS),
+        'hashtags': hashtags,
+        'call_to_action': call_to_action,
+        'references': f"Hashtags: {hashtags}\nCall to Action: {call_to_action}"
+    }
+
+
+def generate_data(num_clients, entries_per_client, month='2025-05', seed=0, calendar_version=1):
+    """Build a data.json document with materialized calendars for num_clients clients."""
+    rng = random.Random(seed)
+    first_day = datetime.strptime(f"{month}-01", '%Y-%m-%d')
+    data = {'clients': {}, 'projects': {}}
+    for i in range(num_clients):
+        name = f"Bench Client {i:05d}"
+        entries = sorted(
+            (generate_entry(rng, first_day + timedelta(days=rng.randrange(28))) for _ in range(entries_per_client)),
+            key=lambda entry: entry['date']
+        )
+        data['clients'][name] = {
+            'companyName': name,
+            'numPosts': entries_per_client,
+            'numReels': 0,
+            'platforms': [p.lower() for p in PLATFORMS],
+            'targetMonth': month,
+            'suggestions': '',
+            'status': 'ready'
+        }
+        data['projects'][name] = {'calendar_entries': entries, 'calendar_version': calendar_version}
+    return data
+
+
+def write_data(path, num_clients, entries_per_client, month='2025-05', seed=0):
+    with open(path, 'w') as f:
+        json.dump(generate_data(num_clients, entries_per_client, month, seed), f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--entries', type=int, default=30, help='calendar entries per client')
+    parser.add_argument('--month', default='2025-05')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='data.json')
+    args = parser.parse_args()
+    write_data(args.output, args.clients, args.entries, args.month, args.seed)
+    print(f"Wrote {args.clients} clients with {args.entries} entries each to {args.output}")
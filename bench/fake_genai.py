@@ -0,0 +1,189 @@
+"""Local stand-in for google.generativeai used by the benchmarks.
+
+install() registers it in sys.modules before app is imported, so every
+Gemini call made by the app is answered here with canned calendar JSON,
+insight text or PNG bytes after a configurable delay and failure rate.
+"""
+import asyncio
+import io
+import json
+import random
+import re
+import sys
+import threading
+import time
+import types as module_types
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from PIL import Image
+
+settings = {
+    'latency': 0.0,
+    'jitter': 0.0,
+    'failure_rate': 0.0,
+    'chunk_size': 64,
+}
+
+_lock = threading.Lock()
+_calls = {'total': 0, 'failed': 0}
+_png_cache = {}
+
+
+class FakeServerError(Exception):
+    """Looks like a retryable 503 to the gateway."""
+
+    code = 503
+
+    def __str__(self):
+        return "503 UNAVAILABLE (simulated)"
+
+
+def _png(size=512):
+    if size not in _png_cache:
+        buffer = io.BytesIO()
+        Image.new('RGB', (size, size), (220, 90, 40)).save(buffer, 'PNG')
+        _png_cache[size] = buffer.getvalue()
+    return _png_cache[size]
+
+
+def _start_call():
+    """Count a call and return how long it should take."""
+    with _lock:
+        _calls['total'] += 1
+    return settings['latency'] + random.uniform(0, settings['jitter'])
+
+
+def _maybe_fail():
+    if random.random() < settings['failure_rate']:
+        with _lock:
+            _calls['failed'] += 1
+        raise FakeServerError()
+
+
+def _simulate():
+    delay = _start_call()
+    if delay:
+        time.sleep(delay)
+    _maybe_fail()
+
+
+def _usage(prompt_text, response_text):
+    return SimpleNamespace(
+        prompt_token_count=len(prompt_text) // 4,
+        candidates_token_count=len(response_text) // 4
+    )
+
+
+def _calendar_json(prompt, schema=None):
+    """Answer a calendar prompt with entries that satisfy its rules and response schema."""
+    dates = re.findall(r'\d{4}-\d{2}-\d{2}', prompt)
+    if len(dates) >= 2:
+        first, last = (datetime.strptime(d, '%Y-%m-%d') for d in dates[:2])
+    else:
+        first = datetime.now().replace(day=1)
+        last = first + timedelta(days=27)
+    properties = (schema or {}).get('items', {}).get('properties', {})
+    platforms = properties.get('platform', {}).get('enum') or ['Instagram']
+    content_types = properties.get('content_type', {}).get('enum') or ['Image']
+    count = re.search(r'exactly (\d+)', prompt)
+    count = int(count.group(1)) if count else 5
+
+    span = (last - first).days + 1
+    entries = [{
+        'date': (first + timedelta(days=i * span // max(count, 1))).strftime('%Y-%m-%d'),
+        'platform': platforms[i % len(platforms)],
+        'content_type': content_types[i % len(content_types)],
+        'topic': f"Benchmark topic {i + 1}",
+        'description': 'A short generated description for load testing',
+        'hashtags': '#bench #load',
+        'call_to_action': 'Order now'
+    } for i in range(count)]
+    return json.dumps(entries)
+
+
+def _respond(contents, config):
+    modalities = getattr(config, 'response_modalities', None) or []
+    if any(m.lower() == 'image' for m in modalities):
+        part = SimpleNamespace(inline_data=SimpleNamespace(data=_png(), mime_type='image/png'), text=None)
+        return SimpleNamespace(
+            text=None,
+            candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))],
+            usage_metadata=_usage(str(contents), '')
+        )
+    if isinstance(contents, (list, tuple)):
+        text = 'Warm colours, bold product photography and short upbeat copy.'
+        prompt = ' '.join(c for c in contents if isinstance(c, str))
+    elif 'Fix these' in str(contents):
+        text = '[]'
+        prompt = str(contents)
+    else:
+        prompt = str(contents)
+        text = _calendar_json(prompt, getattr(config, 'response_schema', None))
+    return SimpleNamespace(text=text, candidates=[], usage_metadata=_usage(prompt, text))
+
+
+class _Models:
+    def generate_content(self, model=None, contents=None, config=None, **kwargs):
+        _simulate()
+        return _respond(contents, config)
+
+    def generate_content_stream(self, model=None, contents=None, config=None, **kwargs):
+        response = self.generate_content(model=model, contents=contents, config=config, **kwargs)
+        text = response.text or ''
+        size = settings['chunk_size']
+        for start in range(0, len(text), size):
+            yield SimpleNamespace(text=text[start:start + size], candidates=[], usage_metadata=response.usage_metadata)
+
+
+class _AsyncModels:
+    """client.aio.models: the same answers, waiting without blocking the event loop."""
+
+    async def generate_content(self, model=None, contents=None, config=None, **kwargs):
+        delay = _start_call()
+        if delay:
+            await asyncio.sleep(delay)
+        _maybe_fail()
+        return _respond(contents, config)
+
+
+class Client:
+    def __init__(self, *args, **kwargs):
+        self.models = _Models()
+        self.aio = SimpleNamespace(models=_AsyncModels())
+
+
+class GenerateContentConfig:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Part:
+    @staticmethod
+    def from_bytes(data, mime_type=None):
+        return SimpleNamespace(inline_data=SimpleNamespace(data=data, mime_type=mime_type), text=None)
+
+
+def calls():
+    with _lock:
+        return dict(_calls)
+
+
+def install(latency=0.0, jitter=0.0, failure_rate=0.0):
+    """Register this module as google.generativeai (and .types) for the current process."""
+    settings.update(latency=latency, jitter=jitter, failure_rate=failure_rate)
+    genai = module_types.ModuleType('google.generativeai')
+    genai_types = module_types.ModuleType('google.generativeai.types')
+    genai_types.GenerateContentConfig = GenerateContentConfig
+    genai_types.Part = Part
+    genai.Client = Client
+    genai.types = genai_types
+    try:
+        import google
+    except ImportError:
+        google = module_types.ModuleType('google')
+        google.__path__ = []
+    google.generativeai = genai
+    sys.modules['google'] = google
+    sys.modules['google.generativeai'] = genai
+    sys.modules['google.generativeai.types'] = genai_types
@@ -0,0 +1,294 @@
+"""Scripted load against the app with a fake Gemini backend and synthetic data.
+
+Usage:
+    python -m bench.run --clients 1000 --entries 60 --requests 200 --concurrency 4 \
+        --latency 0.2 --failure-rate 0.02 --output bench-results.json [--baseline previous.json]
+
+Everything runs in a temporary directory, so the real data.json, caches and
+job database are never touched. Requests go through Flask's test client, so
+results measure the app itself rather than gunicorn or the network. With
+--baseline, latency increases beyond --tolerance are reported and the exit
+status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench import datagen, fake_genai  # noqa: E402
+
+SCENARIOS = ('dashboard', 'client_list', 'search', 'get_calendar_data', 'update_entry', 'preview', 'add_client')
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def summarize(latencies, errors, elapsed, extra=None):
+    ms = [value * 1000 for value in latencies]
+    summary = {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'throughput_rps': round((len(latencies) + errors) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(sum(ms) / len(ms), 3) if ms else None,
+        'p50_ms': round(percentile(ms, 0.5), 3) if ms else None,
+        'p90_ms': round(percentile(ms, 0.9), 3) if ms else None,
+        'p99_ms': round(percentile(ms, 0.99), 3) if ms else None,
+        'max_ms': round(max(ms), 3) if ms else None,
+    }
+    summary.update(extra or {})
+    return summary
+
+
+class Runner:
+    def __init__(self, app_module, args):
+        self.app = app_module
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.projects = app_module.storage.client_names()
+        self._local = threading.local()
+        self._counter = 0
+        self._counter_lock = threading.Lock()
+
+    def client(self):
+        """A logged-in test client per thread."""
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self.app.app.test_client()
+            with client.session_transaction() as session:
+                session['authenticated'] = True
+            self._local.client = client
+        return client
+
+    def next_number(self):
+        with self._counter_lock:
+            self._counter += 1
+            return self._counter
+
+    def run(self, name, requests, step):
+        """Call step() requests times on a thread pool and summarize the latencies."""
+        latencies = []
+        errors = 0
+        extra = {}
+        lock = threading.Lock()
+
+        def one(_):
+            nonlocal errors
+            started = time.perf_counter()
+            try:
+                ok, info = step()
+            except Exception as e:
+                ok, info = False, {'exception': type(e).__name__}
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+                for key, value in (info or {}).items():
+                    extra[key] = extra.get(key, 0) + value if isinstance(value, (int, float)) else value
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            list(pool.map(one, range(requests)))
+        return summarize(latencies, errors, time.perf_counter() - started, extra)
+
+    # Scenarios: each returns (ok, extra counters)
+
+    def dashboard(self):
+        response = self.client().get('/dashboard')
+        return response.status_code == 200, None
+
+    def client_list(self):
+        page = self.rng.randrange(1, max(2, len(self.projects) // 50 + 1))
+        response = self.client().get(f"/api/clients?page={page}&sort=updated&order=desc")
+        return response.status_code == 200, None
+
+    def search(self):
+        word = self.rng.choice(datagen.WORDS)
+        channel = self.rng.choice(list(datagen.PLATFORMS))
+        response = self.client().get(f"/search?q={word}&channel={channel}&approval=pending")
+        return response.status_code == 200, None
+
+    def get_calendar_data(self):
+        project = self.rng.choice(self.projects)
+        response = self.client().get(f"/get_calendar_data/{project}")
+        return response.status_code == 200, None
+
+    def update_entry(self):
+        project = self.rng.choice(self.projects)
+        entries = self.app.storage.get_project(project)['calendar_entries']
+        if not entries:
+            return True, None
+        entry = self.rng.choice(entries)
+        response = self.client().patch(
+            f"/entries/{entry['id']}",
+            json={'approval': self.rng.choice(datagen.APPROVALS)},
+            headers={'If-Match': f'"{entry["version"]}"'}
+        )
+        # Conflicts are the expected outcome of concurrent edits, not failures
+        if response.status_code == 409:
+            return True, {'conflicts': 1}
+        return response.status_code == 200, None
+
+    def preview(self):
+        project = self.rng.choice(self.projects[:self.args.preview_projects])
+        entries = self.app.storage.get_project(project)['calendar_entries']
+        index = self.rng.randrange(max(1, min(len(entries), 5)))
+        response = self.client().get(f"/preview/{project}/{index}")
+        return response.status_code in (200, 304), None
+
+    def add_client(self):
+        number = self.next_number()
+        response = self.client().post('/add_client', data={
+            'companyName': f"Bench New Client {number:05d}",
+            'numPosts': str(self.args.new_client_posts),
+            'numReels': '0',
+            'platforms': json.dumps(['instagram', 'facebook']),
+            'targetMonth': '2025-06',
+            'suggestions': ''
+        })
+        if response.status_code != 202:
+            return False, None
+        job_id = response.get_json()['job_id']
+        # Measure until the calendar is ready, not just until the job is queued
+        deadline = time.monotonic() + self.args.job_timeout
+        while time.monotonic() < deadline:
+            job = self.app.job_queue.get(job_id)
+            if job['status'] in ('done', 'failed'):
+                return job['status'] == 'done', None
+            time.sleep(0.02)
+        return False, {'timeouts': 1}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Return a line for each scenario whose p50 or p90 grew by more than tolerance."""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p90_ms'):
+            if current.get(metric) and previous.get(metric):
+                change = (current[metric] - previous[metric]) / previous[metric]
+                if change > tolerance:
+                    regressions.append(f"{name} {metric}: {previous[metric]} -> {current[metric]} ms (+{change:.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the SMM dashboard against a fake Gemini backend.')
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--entries', type=int, default=30, help='calendar entries per client')
+    parser.add_argument('--backend', choices=('sqlite', 'json'), default='sqlite')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--latency', type=float, default=0.05, help='fake model latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random latency in seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of fake model calls that fail')
+    parser.add_argument('--preview-projects', type=int, default=5, help='projects the preview scenario draws from')
+    parser.add_argument('--new-client-posts', type=int, default=10)
+    parser.add_argument('--job-timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench-results.json')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed latency increase over the baseline')
+    args = parser.parse_args(argv)
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    workdir = tempfile.mkdtemp(prefix='smm-bench-')
+    started = time.perf_counter()
+    datagen.write_data(os.path.join(workdir, 'data.json'), args.clients, args.entries, seed=args.seed)
+    datagen_seconds = time.perf_counter() - started
+
+    os.environ.update({
+        'STORAGE_BACKEND': args.backend,
+        'DATA_FILE': os.path.join(workdir, 'data.json'),
+        'DATABASE_PATH': os.path.join(workdir, 'data.db'),
+        'JOBS_DATABASE_PATH': os.path.join(workdir, 'jobs.db'),
+        'PREVIEW_CACHE_DIR': os.path.join(workdir, 'cache', 'previews'),
+        'INSIGHT_CACHE_DIR': os.path.join(workdir, 'cache', 'insights'),
+        'CALENDAR_CACHE_DIR': os.path.join(workdir, 'cache', 'calendars'),
+        'RENDER_CACHE_DIR': os.path.join(workdir, 'cache', 'rendered'),
+        'VARIANT_CACHE_DIR': os.path.join(workdir, 'cache', 'variants'),
+        'GOOGLE_API_KEY': 'bench',
+        # Measure the app, not the gateway's client-side rate limit
+        'GEMINI_REQUESTS_PER_MINUTE': '1000000',
+        'GEMINI_BURST': '1000',
+    })
+    fake_genai.install(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate)
+    # Relative paths used by the app (uploads, logs) land in the work directory
+    os.chdir(workdir)
+
+    started = time.perf_counter()
+    import app as app_module
+    import_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    app_module.create_app()
+    create_app_seconds = time.perf_counter() - started
+    app_module.app.logger.disabled = True
+
+    runner = Runner(app_module, args)
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'setup': {
+            'datagen_seconds': round(datagen_seconds, 3),
+            'app_import_seconds': round(import_seconds, 3),
+            'create_app_seconds': round(create_app_seconds, 3),
+            'data_json_bytes': os.path.getsize(os.path.join(workdir, 'data.json')),
+        },
+        'scenarios': {},
+    }
+    for name in [s.strip() for s in args.scenarios.split(',') if s.strip()]:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name}; choose from {', '.join(SCENARIOS)}")
+        requests = args.requests if name != 'add_client' else max(1, args.requests // 10)
+        results['scenarios'][name] = runner.run(name, requests, getattr(runner, name))
+        summary = results['scenarios'][name]
+        print(f"{name:20} {summary['requests']:6} req  {summary['errors']:4} err  "
+              f"p50 {summary['p50_ms']} ms  p90 {summary['p90_ms']} ms  {summary['throughput_rps']} req/s")
+    results['gateway'] = app_module.gateway.stats()
+    results['fake_model_calls'] = fake_genai.calls()
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
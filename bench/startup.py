@@ -0,0 +1,100 @@
+"""Startup budget check: import time and memory of a fresh worker.
+
+Usage: python -m bench.startup [--runs 5] [--max-import-ms 400] [--max-rss-mb 80]
+
+Each run starts a new interpreter in a temporary directory and measures:
+- importing app
+- create_app()
+- the first request (the login page)
+- peak RSS
+
+The check fails (exit status 1) when the median run exceeds the budget,
+or when heavy libraries that should load lazily were imported during
+startup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed once a worker generates content or touches images
+LAZY_MODULES = ('google.generativeai', 'PIL', 'xlsxwriter')
+
+CHILD = """
+import json, resource, sys, time
+sys.path.insert(0, {repo!r})
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+app.app.test_client().get('/login')
+served = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'loaded': [name for name in {lazy!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure_once():
+    workdir = tempfile.mkdtemp(prefix='smm-startup-')
+    env = dict(
+        os.environ,
+        DATA_FILE=os.path.join(workdir, 'data.json'),
+        DATABASE_PATH=os.path.join(workdir, 'data.db'),
+        JOBS_DATABASE_PATH=os.path.join(workdir, 'jobs.db'),
+        PREVIEW_CACHE_DIR=os.path.join(workdir, 'cache', 'previews'),
+        INSIGHT_CACHE_DIR=os.path.join(workdir, 'cache', 'insights'),
+        CALENDAR_CACHE_DIR=os.path.join(workdir, 'cache', 'calendars'),
+        RENDER_CACHE_DIR=os.path.join(workdir, 'cache', 'rendered'),
+        VARIANT_CACHE_DIR=os.path.join(workdir, 'cache', 'variants'),
+    )
+    output = subprocess.check_output(
+        [sys.executable, '-c', CHILD.format(repo=REPO_ROOT, lazy=LAZY_MODULES)], cwd=workdir, env=env
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check app startup time and memory against a budget.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-import-ms', type=float, default=float(os.environ.get('STARTUP_MAX_IMPORT_MS', 400)))
+    parser.add_argument('--max-rss-mb', type=float, default=float(os.environ.get('STARTUP_MAX_RSS_MB', 80)))
+    parser.add_argument('--output', help='write the measurements as JSON to this file')
+    args = parser.parse_args(argv)
+
+    runs = [measure_once() for _ in range(args.runs)]
+    result = {
+        key: round(statistics.median(run[key] for run in runs), 2)
+        for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'rss_mb')
+    }
+    result['eagerly_loaded'] = sorted({name for run in runs for name in run['loaded']})
+    result['budget'] = {'max_import_ms': args.max_import_ms, 'max_rss_mb': args.max_rss_mb}
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    failures = []
+    if result['import_ms'] + result['create_app_ms'] > args.max_import_ms:
+        failures.append(f"startup took {result['import_ms'] + result['create_app_ms']:.0f} ms (budget {args.max_import_ms:.0f} ms)")
+    if result['rss_mb'] > args.max_rss_mb:
+        failures.append(f"RSS is {result['rss_mb']:.1f} MB (budget {args.max_rss_mb:.0f} MB)")
+    if result['eagerly_loaded']:
+        failures.append(f"loaded at startup: {', '.join(result['eagerly_loaded'])}")
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
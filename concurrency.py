@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def imap_bounded(fn, items, max_workers, timeout=None):
+    """Run fn over items on a bounded thread pool, yielding (index, result, error) as calls finish.
+
+    A call that has been running for longer than timeout seconds is reported
+    with a TimeoutError and abandoned; its thread is left to finish on its own.
+    """
+    items = list(items)
+    if not items:
+        return
+    started = {}
+
+    def run(index, item):
+        started[index] = time.monotonic()
+        return fn(item)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))))
+    futures = {pool.submit(run, index, item): index for index, item in enumerate(items)}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=0.25 if timeout else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
+            if timeout:
+                now = time.monotonic()
+                for future in list(pending):
+                    index = futures[future]
+                    if index in started and now - started[index] > timeout:
+                        pending.discard(future)
+                        yield index, None, TimeoutError(f"Timed out after {timeout}s")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def map_bounded(fn, items, max_workers, timeout=None, on_error=None):
+    """Order-preserving variant of imap_bounded. Failed or timed out calls give None."""
+    items = list(items)
+    results = [None] * len(items)
+    for index, result, error in imap_bounded(fn, items, max_workers, timeout):
+        if error is not None:
+            if on_error:
+                on_error(index, error)
+            continue
+        results[index] = result
+    return results
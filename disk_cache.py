@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class DiskCache:
+    """Content-addressed file cache with size-bounded LRU eviction.
+
+    Entries are stored as one file per key. The file mtime records when the
+    entry was written (used for Last-Modified and TTL), and the atime is
+    bumped on every hit so eviction removes the least recently used files
+    first.
+
+    The total size is tracked as entries are written and deleted, so a
+    write only scans the directory when the cache may be over budget, or
+    every rescan_interval seconds to count entries written by other
+    processes.
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, suffix='', ttl=None, rescan_interval=60):
+        # Absolute, so paths handed to send_file don't depend on the working directory
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.ttl = ttl
+        self.rescan_interval = rescan_interval
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._scanned_at = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        """Build a stable hash key from JSON-serialisable parts."""
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def _is_expired(self, stat):
+        return self.ttl is not None and time.time() - stat.st_mtime > self.ttl
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _resized(self, delta):
+        with self._lock:
+            if self._size is not None:
+                self._size += delta
+
+    @staticmethod
+    def _file_size(path):
+        try:
+            return os.stat(path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def lookup(self, key):
+        """Return (path, mtime) for a live entry, or None on a miss."""
+        path = self.path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        if self._is_expired(stat):
+            self.delete(key)
+            self._count('misses')
+            return None
+        # Record the access for LRU ordering without touching the write time
+        try:
+            os.utime(path, (time.time(), stat.st_mtime))
+        except OSError:
+            pass
+        self._count('hits')
+        return path, stat.st_mtime
+
+    def get(self, key):
+        found = self.lookup(key)
+        if found is None:
+            return None
+        try:
+            with open(found[0], 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            # Evicted by another worker between stat and open
+            return None
+
+    def set(self, key, data):
+        """Atomically write an entry and evict old ones if over budget."""
+        # Created on first write so that merely constructing a cache has no side effects
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            replaced = self._file_size(self.path(key))
+            os.replace(tmp_path, self.path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._resized(len(data) - replaced)
+        self.evict()
+        return self.path(key)
+
+    def store_stream(self, stream, chunk_size=64 * 1024):
+        """Copy a file object into the cache under the SHA-256 of its content.
+
+        The data is hashed while it is written, a chunk at a time, so it is
+        never held in memory. Returns (key, path); content that is already
+        stored is not written again.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(chunk_size), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            key = digest.hexdigest()
+            if self.lookup(key):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, self.path(key))
+                self._resized(size)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+        return key, self.path(key)
+
+    def delete(self, key):
+        size = self._file_size(self.path(key))
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            return False
+        self._resized(-size)
+        return True
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_bytes.
+
+        Returns without scanning while the tracked size is within budget
+        and the last scan is recent.
+        """
+        with self._lock:
+            if (self._size is not None and self._size <= self.max_bytes
+                    and time.time() - self._scanned_at < self.rescan_interval):
+                return 0
+            self._scanned_at = time.time()
+            entries = []
+            total = 0
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    if not item.is_file() or item.name.startswith('.tmp-'):
+                        continue
+                    stat = item.stat()
+                    entries.append((stat.st_atime, stat.st_size, item.path))
+                    total += stat.st_size
+            removed = 0
+            if total > self.max_bytes:
+                for _, size, path in sorted(entries):
+                    if total <= self.max_bytes:
+                        break
+                    try:
+                        os.remove(path)
+                        total -= size
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+            self._size = total
+            return removed
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': (hits / lookups) if lookups else 0.0,
+        }
@@ -0,0 +1,134 @@
+import csv
+import hashlib
+import importlib.util
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+COLUMNS = [
+    ('Project', None),
+    ('Date', 'date'),
+    ('Day', 'day'),
+    ('Content Type', 'content_type'),
+    ('Channel', 'channel'),
+    ('Status', 'status'),
+    ('Text Content', 'text_content'),
+    ('Approval', 'approval'),
+    ('References', 'references'),
+]
+
+
+def export_row(project, entry):
+    return [project if key is None else entry.get(key) or '' for _, key in COLUMNS]
+
+
+class _LineBuffer:
+    """File-like object for csv.writer that hands back each written line."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    """Yield CSV text for (project, entry) pairs, one line at a time."""
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow([title for title, _ in COLUMNS])
+    for project, entry in rows:
+        yield writer.writerow(export_row(project, entry))
+
+
+def _ics_escape(value):
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _ics_line(line):
+    """Fold a content line to 75 octets as required by RFC 5545."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Don't split a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def iter_ics(rows):
+    """Yield an iCalendar feed with one all-day event per entry."""
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    yield ('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//SMM Dashboard//Content Calendar//EN\r\n'
+           'CALSCALE:GREGORIAN\r\n')
+    for project, entry in rows:
+        try:
+            day = datetime.strptime(entry.get('date') or '', '%Y-%m-%d')
+        except ValueError:
+            continue
+        text = entry.get('text_content') or ''
+        uid = hashlib.sha1('\0'.join(
+            [project, entry['date'], entry.get('channel') or '', entry.get('content_type') or '', text]
+        ).encode('utf-8')).hexdigest()
+        summary = f"[{project}] {entry.get('channel', '')} {entry.get('content_type', '')}: {text.splitlines()[0] if text else ''}"
+        description = '\n'.join(part for part in (text, entry.get('references') or '') if part)
+        lines = [
+            'BEGIN:VEVENT',
+            f"UID:{uid}@smm-dashboard",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART;VALUE=DATE:{day.strftime('%Y%m%d')}",
+            f"DTEND;VALUE=DATE:{(day + timedelta(days=1)).strftime('%Y%m%d')}",
+            f"SUMMARY:{_ics_escape(summary)}",
+            f"DESCRIPTION:{_ics_escape(description)}",
+            f"CATEGORIES:{_ics_escape(entry.get('channel') or '')}",
+            'END:VEVENT',
+        ]
+        yield ''.join(_ics_line(line) for line in lines)
+    yield 'END:VCALENDAR\r\n'
+
+
+def xlsx_available():
+    return importlib.util.find_spec('xlsxwriter') is not None
+
+
+def iter_xlsx(rows, chunk_size=64 * 1024):
+    """Yield the bytes of an XLSX workbook.
+
+    xlsxwriter's constant_memory mode flushes each row to a temp file as it
+    is written, and the finished workbook is streamed from disk.
+    """
+    import xlsxwriter
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        worksheet = workbook.add_worksheet('Calendar')
+        bold = workbook.add_format({'bold': True})
+        wrap = workbook.add_format({'text_wrap': True, 'valign': 'top'})
+        worksheet.write_row(0, 0, [title for title, _ in COLUMNS], bold)
+        worksheet.set_column(6, 6, 60)
+        worksheet.set_column(8, 8, 40)
+        for row_number, (project, entry) in enumerate(rows, start=1):
+            worksheet.write_row(row_number, 0, [str(value) for value in export_row(project, entry)], wrap)
+        workbook.close()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+# format -> (writer, mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv; charset=utf-8', 'csv'),
+    'ics': (iter_ics, 'text/calendar; charset=utf-8', 'ics'),
+    'xlsx': (iter_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
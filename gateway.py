@@ -0,0 +1,492 @@
+import asyncio
+import contextvars
+import itertools
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+class GatewayError(Exception):
+    """A model call failed after retries, or was refused by the gateway."""
+
+
+class CircuitOpenError(GatewayError):
+    """The upstream is considered unhealthy and calls are failing fast."""
+
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_STATUS_NAMES = ('RESOURCE_EXHAUSTED', 'UNAVAILABLE', 'DEADLINE_EXCEEDED', 'INTERNAL')
+
+# time.monotonic() by which calls made in the current thread or task must be finished
+_deadline = contextvars.ContextVar('gateway_deadline', default=None)
+
+
+def is_retryable(error):
+    """Timeouts, connection problems, rate limiting and 5xx responses are worth retrying."""
+    if isinstance(error, (TimeoutError, FutureTimeoutError, ConnectionError)):
+        return True
+    for attr in ('code', 'status_code'):
+        code = getattr(error, attr, None)
+        if isinstance(code, int):
+            return code in RETRYABLE_STATUS_CODES
+    message = str(error)
+    return any(name in message for name in RETRYABLE_STATUS_NAMES)
+
+
+def payload_size(value):
+    """Approximate size in bytes of the text and inline data in a request or response payload."""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(payload_size(item) for item in value)
+    inline_data = getattr(value, 'inline_data', None)
+    if inline_data is not None and getattr(inline_data, 'data', None) is not None:
+        return len(inline_data.data)
+    text = getattr(value, 'text', None)
+    if isinstance(text, str):
+        return len(text.encode('utf-8'))
+    return 0
+
+
+def response_size(response):
+    candidates = getattr(response, 'candidates', None)
+    if not candidates:
+        try:
+            return payload_size(getattr(response, 'text', None))
+        except Exception:
+            return 0
+    return sum(
+        payload_size(getattr(getattr(candidate, 'content', None), 'parts', None) or [])
+        for candidate in candidates
+    )
+
+
+class TokenBucket:
+    """Classic token bucket: refills at rate tokens per second up to capacity."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Take a token if there is one and return 0, otherwise return the seconds until there will be."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, timeout=None):
+        """Take one token, waiting up to timeout seconds. Returns False if none became available."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout=None):
+        """acquire() for coroutines: waits without blocking the event loop."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = await self._take_async()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    async def _take_async(self):
+        return self._take()
+
+
+class SharedTokenBucket(TokenBucket):
+    """A token bucket kept in a SQLite table, so all worker processes draw from one budget.
+
+    Tokens are taken in an immediate transaction, so concurrent takers in
+    any process never spend the same token twice.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS token_buckets (
+        name TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated REAL NOT NULL
+    );
+    """
+
+    def __init__(self, rate, capacity, path='jobs.db', name='gemini'):
+        super().__init__(rate, capacity)
+        self.path = path
+        self.name = name
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # A connection inherited from a parent process must not be reused
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _take(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Wall-clock time, since monotonic clocks are not comparable across processes
+            now = time.time()
+            row = conn.execute('SELECT tokens, updated FROM token_buckets WHERE name = ?', (self.name,)).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + max(0, now - row[1]) * self.rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            conn.execute(
+                'INSERT OR REPLACE INTO token_buckets (name, tokens, updated) VALUES (?, ?, ?)',
+                (self.name, tokens, now)
+            )
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return wait
+
+    async def _take_async(self):
+        # Waiting on the database lock must not block the event loop
+        return await asyncio.to_thread(self._take)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single trial call through after reset_timeout."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                return True
+            # Open, or half open with the trial call already in flight
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def release(self):
+        """Give back a half-open trial slot without judging the upstream."""
+        with self._lock:
+            if self.state == 'half_open':
+                self.state = 'open'
+                self.opened_at = time.monotonic() - self.reset_timeout
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.state == 'open' and time.monotonic() - self.opened_at < self.reset_timeout
+
+
+class ModelGateway:
+    """Single entry point for Gemini calls.
+
+    Every call is rate limited by a token bucket, bounded by a timeout,
+    retried with jittered exponential backoff on transient errors, and
+    guarded by a circuit breaker that fails fast while the upstream is
+    unhealthy. Inside a deadline() block, attempts are cut short and no
+    retry is started that could not finish in time. The circuit breaker
+    and concurrency limit apply per process; the rate limit does too unless
+    a shared bucket is passed in.
+    """
+
+    def __init__(self, client=None, timeout=60, max_retries=3, backoff_base=0.5, backoff_max=10,
+                 requests_per_minute=60, burst=10, failure_threshold=5, reset_timeout=30, max_concurrency=16,
+                 observer=None, client_factory=None, bucket=None):
+        # Pass client_factory instead of client to create the SDK client on first use
+        self._client = client
+        self._client_factory = client_factory
+        self._client_lock = threading.Lock()
+        # Called with a dict describing each finished model call, e.g. to record metrics
+        self.observer = observer
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Pass a SharedTokenBucket to apply requests_per_minute across processes
+        self.bucket = bucket or TokenBucket(requests_per_minute / 60.0, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='gemini')
+        self._counters = {
+            'requests': 0,
+            'successes': 0,
+            'failures': 0,
+            'retries': 0,
+            'timeouts': 0,
+            'rate_limited': 0,
+            'circuit_rejections': 0,
+            'deadline_exceeded': 0,
+        }
+        self._counters_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+        return self._client
+
+    def _count(self, name, amount=1):
+        with self._counters_lock:
+            self._counters[name] += amount
+
+    def _backoff(self, attempt):
+        # Full jitter keeps retries from many workers from synchronising
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @contextmanager
+    def deadline(self, seconds):
+        """Make calls in this block (thread or task) finish within seconds from now. Nested blocks keep the earliest."""
+        until = time.monotonic() + seconds
+        current = _deadline.get()
+        token = _deadline.set(until if current is None else min(current, until))
+        try:
+            yield
+        finally:
+            _deadline.reset(token)
+
+    def _attempt_timeout(self, attempt, timeout, delay=0):
+        """Timeout for an attempt starting after delay seconds, or None if it should not be started.
+
+        The first attempt is shortened to the time left; a retry only starts
+        if a full attempt still fits.
+        """
+        until = _deadline.get()
+        if until is None:
+            return timeout
+        remaining = until - time.monotonic() - delay
+        if remaining <= 0 or (attempt and remaining < timeout):
+            self._count('deadline_exceeded')
+            return None
+        return min(timeout, remaining)
+
+    def call(self, fn, *args, timeout=None, **kwargs):
+        """Run fn(*args, **kwargs) under the gateway's limits and return its result."""
+        timeout = timeout or self.timeout
+        self._count('requests')
+        if not self.breaker.allow():
+            self._count('circuit_rejections')
+            raise CircuitOpenError("Gemini is temporarily unavailable")
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            delay = self._backoff(attempt - 1) if attempt else 0
+            attempt_timeout = self._attempt_timeout(attempt, timeout, delay)
+            if attempt_timeout is None:
+                last_error = last_error or GatewayError("No time left for a Gemini call before the deadline")
+                break
+            if attempt:
+                self._count('retries')
+                time.sleep(delay)
+            if not self.bucket.acquire(timeout=attempt_timeout):
+                self._count('rate_limited')
+                last_error = GatewayError("Rate limit exceeded waiting for a request slot")
+                continue
+            future = self._executor.submit(fn, *args, **kwargs)
+            try:
+                result = future.result(timeout=attempt_timeout)
+            except FutureTimeoutError:
+                # The SDK's own request timeout ends the abandoned call, so it doesn't hold a pool thread for long
+                self._count('timeouts')
+                last_error = TimeoutError(f"Gemini call timed out after {round(attempt_timeout, 1)}s")
+                continue
+            except Exception as e:
+                last_error = e
+                if is_retryable(e):
+                    continue
+                # The upstream answered; a bad request says nothing about its health
+                self.breaker.record_success()
+                self._count('failures')
+                raise
+            self.breaker.record_success()
+            self._count('successes')
+            return result
+
+        # An attempt that was not started for lack of time doesn't count
+        attempts = attempt + 1 if attempt_timeout is not None else attempt
+        raise self._give_up(last_error, attempts) from last_error
+
+    async def call_async(self, fn, *args, timeout=None, **kwargs):
+        """call() for a coroutine function, such as the SDK's client.aio methods.
+
+        The same counters, rate limit and circuit breaker apply, but the
+        call runs on the event loop instead of the gateway's thread pool,
+        so many can be in flight in one thread.
+        """
+        timeout = timeout or self.timeout
+        self._count('requests')
+        if not self.breaker.allow():
+            self._count('circuit_rejections')
+            raise CircuitOpenError("Gemini is temporarily unavailable")
+
+        last_error = None
+        try:
+            for attempt in range(self.max_retries + 1):
+                delay = self._backoff(attempt - 1) if attempt else 0
+                attempt_timeout = self._attempt_timeout(attempt, timeout, delay)
+                if attempt_timeout is None:
+                    last_error = last_error or GatewayError("No time left for a Gemini call before the deadline")
+                    break
+                if attempt:
+                    self._count('retries')
+                    await asyncio.sleep(delay)
+                if not await self.bucket.acquire_async(timeout=attempt_timeout):
+                    self._count('rate_limited')
+                    last_error = GatewayError("Rate limit exceeded waiting for a request slot")
+                    continue
+                try:
+                    result = await asyncio.wait_for(fn(*args, **kwargs), attempt_timeout)
+                except asyncio.TimeoutError:
+                    self._count('timeouts')
+                    last_error = TimeoutError(f"Gemini call timed out after {round(attempt_timeout, 1)}s")
+                    continue
+                except Exception as e:
+                    last_error = e
+                    if is_retryable(e):
+                        continue
+                    self.breaker.record_success()
+                    self._count('failures')
+                    raise
+                self.breaker.record_success()
+                self._count('successes')
+                return result
+        except asyncio.CancelledError:
+            # The caller went away (e.g. the client disconnected); don't hold a half-open trial slot
+            self.breaker.release()
+            raise
+
+        # An attempt that was not started for lack of time doesn't count
+        attempts = attempt + 1 if attempt_timeout is not None else attempt
+        raise self._give_up(last_error, attempts) from last_error
+
+    def _give_up(self, last_error, attempts):
+        """Record a call that ran out of attempts and return the error to raise."""
+        if isinstance(last_error, GatewayError):
+            # Only our own rate limiter refused; the upstream was never reached
+            self.breaker.release()
+        else:
+            self.breaker.record_failure()
+        self._count('failures')
+        return GatewayError(f"Gemini call failed after {attempts} attempts: {last_error}")
+
+    def _observe(self, method, kwargs, started, outcome, bytes_out=0, last_response=None):
+        if self.observer is None:
+            return
+        # Streaming responses report cumulative usage on their final chunk
+        usage = getattr(last_response, 'usage_metadata', None)
+        try:
+            self.observer({
+                'method': method,
+                'model': kwargs.get('model', ''),
+                'seconds': time.monotonic() - started,
+                'outcome': outcome,
+                'bytes_in': payload_size(kwargs.get('contents')),
+                'bytes_out': bytes_out,
+                'prompt_tokens': getattr(usage, 'prompt_token_count', None) or 0,
+                'response_tokens': getattr(usage, 'candidates_token_count', None) or 0,
+            })
+        except Exception:
+            # Instrumentation must never break a model call
+            pass
+
+    def generate_content(self, timeout=None, **kwargs):
+        started = time.monotonic()
+        try:
+            response = self.call(self.client.models.generate_content, timeout=timeout, **kwargs)
+        except Exception:
+            self._observe('generate_content', kwargs, started, 'error')
+            raise
+        self._observe('generate_content', kwargs, started, 'success', response_size(response), response)
+        return response
+
+    async def generate_content_async(self, timeout=None, **kwargs):
+        """generate_content() through the SDK's async client, which keeps one connection pool per process."""
+        started = time.monotonic()
+        try:
+            response = await self.call_async(self.client.aio.models.generate_content, timeout=timeout, **kwargs)
+        except Exception:
+            self._observe('generate_content', kwargs, started, 'error')
+            raise
+        self._observe('generate_content', kwargs, started, 'success', response_size(response), response)
+        return response
+
+    def generate_content_stream(self, timeout=None, **kwargs):
+        """Yield response chunks from a streaming call.
+
+        Opening the stream and waiting for the first chunk go through call(),
+        so the rate limit, retries and circuit breaker apply there. Later
+        chunks are read directly and rely on the client's own read timeout.
+        """
+        def open_stream():
+            iterator = iter(self.client.models.generate_content_stream(**kwargs))
+            return next(iterator, None), iterator
+
+        started = time.monotonic()
+        bytes_out = 0
+        last_chunk = None
+        outcome = 'error'
+        try:
+            first, iterator = self.call(open_stream, timeout=timeout)
+            if first is not None:
+                for chunk in itertools.chain([first], iterator):
+                    bytes_out += response_size(chunk)
+                    last_chunk = chunk
+                    yield chunk
+            outcome = 'success'
+        except GeneratorExit:
+            outcome = 'cancelled'
+            raise
+        finally:
+            self._observe('generate_content_stream', kwargs, started, outcome, bytes_out, last_chunk)
+
+    def stats(self):
+        with self._counters_lock:
+            stats = dict(self._counters)
+        stats['circuit_state'] = 'open' if self.breaker.is_open else self.breaker.state
+        stats['consecutive_failures'] = self.breaker.failures
+        return stats
@@ -0,0 +1,278 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """Persistent background job queue, run by a thread pool in each worker.
+
+    Jobs live in a SQLite table so they survive restarts and can be polled
+    from any gunicorn worker. A worker claims a job by taking a lease on it;
+    if the worker dies, the lease expires and another worker picks the job
+    up again, up to max_attempts times. Finished jobs and their events are
+    deleted keep_seconds after they finish.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        lease_until REAL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at);
+    CREATE TABLE IF NOT EXISTS job_events (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT NOT NULL,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events(job_id, seq);
+    """
+
+    def __init__(self, path='jobs.db', workers=2, lease_seconds=600, max_attempts=3, poll_interval=1.0,
+                 keep_seconds=7 * 24 * 3600, purge_interval=3600):
+        self.path = path
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.keep_seconds = keep_seconds
+        self.purge_interval = purge_interval
+        self._last_purge = 0
+        self.handlers = {}
+        self.failure_handlers = {}
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._started_pid = None
+        self._start_lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # A connection inherited from a parent process must not be reused
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            # The database is opened lazily; the schema statements are idempotent
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def register(self, kind):
+        """Decorator registering the handler for a job kind.
+
+        Handlers are called with (payload, job_id) and return a
+        JSON-serialisable result. Raising marks the job as failed.
+        """
+        def decorator(fn):
+            self.handlers[kind] = fn
+            return fn
+        return decorator
+
+    def on_failure(self, kind):
+        """Decorator registering a cleanup for failed jobs of a kind.
+
+        It is called with (payload, job_id, error) whenever a job of that kind
+        ends as failed: when its handler raises, when no handler is registered,
+        and when it is abandoned after max_attempts worker failures.
+        """
+        def decorator(fn):
+            self.failure_handlers[kind] = fn
+            return fn
+        return decorator
+
+    def submit(self, kind, payload, job_id=None):
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, kind, 'queued', json.dumps(payload), now, now)
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        row = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'attempts': row['attempts'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+        }
+
+    def retry(self, job_id):
+        """Queue a failed job again. Returns False if it isn't failed.
+
+        Its events are kept, so a handler can skip work it already finished.
+        """
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = 'queued', error = NULL, attempts = 0, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'failed'",
+                (time.time(), job_id)
+            ).rowcount
+        if updated:
+            self._wakeup.set()
+        return bool(updated)
+
+    def extend_lease(self, job_id):
+        """Keep a long-running job from being picked up again by another worker."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, time.time(), job_id)
+            )
+
+    def add_event(self, job_id, data):
+        """Record a progress event for a running job, readable from any worker."""
+        with self._transaction() as conn:
+            conn.execute('INSERT INTO job_events (job_id, data) VALUES (?, ?)', (job_id, json.dumps(data)))
+
+    def events(self, job_id, after=0):
+        """Return (seq, data) pairs for a job's events newer than seq after."""
+        return [(row['seq'], json.loads(row['data'])) for row in self._connection().execute(
+            'SELECT seq, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq', (job_id, after)
+        )]
+
+    def purge(self, older_than=None):
+        """Delete jobs that finished before older_than (default: keep_seconds ago) and their events.
+
+        Returns the number of jobs deleted.
+        """
+        if older_than is None:
+            older_than = time.time() - self.keep_seconds
+        with self._transaction() as conn:
+            finished = "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?"
+            conn.execute(f'DELETE FROM job_events WHERE job_id IN ({finished})', (older_than,))
+            return conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (older_than,)
+            ).rowcount
+
+    def start(self):
+        """Start the worker threads for this process. Safe to call repeatedly, and after fork."""
+        if self._started_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            # Connections must not be shared with a parent process
+            self._local = threading.local()
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True).start()
+            self._started_pid = os.getpid()
+
+    def _claim(self):
+        now = time.time()
+        error = 'Job abandoned after repeated worker failures'
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts FROM jobs "
+                "WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row['attempts'] < self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (now + self.lease_seconds, now, row['id'])
+                )
+                return row['id'], row['kind'], json.loads(row['payload'])
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                (error, now, row['id'])
+            )
+        self._failed(row['id'], row['kind'], json.loads(row['payload']), error)
+        return None
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, lease_until = NULL, updated_at = ? WHERE id = ?',
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+
+    def _failed(self, job_id, kind, payload, error):
+        handler = self.failure_handlers.get(kind)
+        if handler is None:
+            return
+        try:
+            handler(payload, job_id, error)
+        except Exception as e:
+            logger.error(f"Failure handler for job {job_id} ({kind}) failed: {str(e)}\n{traceback.format_exc()}")
+
+    def _purge_when_due(self):
+        if time.time() - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = time.time()
+        try:
+            purged = self.purge()
+        except sqlite3.Error as e:
+            logger.error(f"Error purging finished jobs: {str(e)}")
+            return
+        if purged:
+            logger.info(f"Purged {purged} finished jobs")
+
+    def _run(self):
+        while True:
+            try:
+                claimed = self._claim()
+            except sqlite3.Error as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                claimed = None
+            if claimed is None:
+                self._purge_when_due()
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, kind, payload = claimed
+            handler = self.handlers.get(kind)
+            if handler is None:
+                error = f"No handler registered for job kind {kind}"
+                self._finish(job_id, 'failed', error=error)
+                self._failed(job_id, kind, payload, error)
+                continue
+            try:
+                result = handler(payload, job_id)
+                self._finish(job_id, 'done', result=result)
+            except Exception as e:
+                logger.error(f"Job {job_id} ({kind}) failed: {str(e)}\n{traceback.format_exc()}")
+                self._finish(job_id, 'failed', error=str(e))
+                self._failed(job_id, kind, payload, str(e))
@@ -0,0 +1,322 @@
+import bisect
+import atexit
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self, values=None, labelnames=None):
+        """Text-format lines for values (default: this process's), keyed by label values."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples(
+            self.values() if values is None else values,
+            self.labelnames if labelnames is None else labelnames
+        ))
+        return lines
+
+    def _samples(self, values, labelnames):
+        return [f"{self.name}{_format_labels(labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def values(self):
+        with self._lock:
+            return {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+
+    def _samples(self, values, labelnames):
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labelnames, key, ('le', _format_value(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labelnames, key)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Metric read from a function at scrape time, for values tracked elsewhere.
+
+    The function returns (label_values, value) pairs.
+    """
+
+    def __init__(self, name, documentation, kind, labelnames, fn):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def values(self):
+        return {tuple(str(v) for v in key): value for key, value in self.fn()}
+
+
+class Registry:
+    """Collects metrics for this process and renders the Prometheus text format."""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, kind, labelnames, fn):
+        return self._add(CallbackMetric(name, documentation, kind, labelnames, fn))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Current values of every metric, as JSON-serialisable data."""
+        return {
+            metric.name: [[list(key), value] for key, value in metric.values().items()]
+            for metric in self._metrics
+        }
+
+    def _merge(self, metric, snapshots):
+        merged = {}
+        for process, snapshot in sorted(snapshots.items()):
+            for key, value in snapshot.get(metric.name, []):
+                key = tuple(key)
+                if metric.kind == 'gauge':
+                    merged[key + (process,)] = value
+                elif metric.kind == 'histogram':
+                    counts, total = merged.get(key, ([0] * len(value[0]), 0.0))
+                    merged[key] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+                else:
+                    merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def combine(self, snapshots):
+        """Sum the counters and histograms of several snapshots into one. Gauges are dropped."""
+        return {
+            metric.name: [[list(key), value] for key, value in self._merge(metric, snapshots).items()]
+            for metric in self._metrics if metric.kind != 'gauge'
+        }
+
+    def render_merged(self, snapshots):
+        """Render several processes' snapshots, keyed by process id, as one set of metrics.
+
+        Counters and histograms are summed across processes. Gauges describe
+        one process each, so they keep a process label instead.
+        """
+        lines = []
+        for metric in self._metrics:
+            labelnames = metric.labelnames + ('process',) if metric.kind == 'gauge' else None
+            lines.extend(metric.render(self._merge(metric, snapshots), labelnames))
+        return '\n'.join(lines) + '\n'
+
+
+class SharedMetrics:
+    """Publish each process's metrics to a SQLite table so a scrape of any worker covers all of them.
+
+    A process writes its snapshot at most every publish_interval seconds,
+    and always just before it serves a scrape. The counters and histograms
+    of processes that have exited (or, on other hosts, not published for
+    stale_seconds) are folded into a single retired row, so totals never
+    go backwards when a worker is replaced; their gauges are dropped.
+    """
+
+    RETIRED = 'retired'
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS metric_snapshots (
+        process TEXT PRIMARY KEY,
+        updated REAL NOT NULL,
+        data TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, registry, path='jobs.db', publish_interval=5, stale_seconds=300):
+        self.registry = registry
+        self.path = path
+        self.publish_interval = publish_interval
+        self.stale_seconds = stale_seconds
+        self._local = threading.local()
+        self._published_at = 0
+        self._publish_lock = threading.Lock()
+        # Counts since the last throttled publish would otherwise be lost when the worker exits
+        atexit.register(self._publish_at_exit)
+
+    def _publish_at_exit(self):
+        if self._published_at:
+            try:
+                self.publish(force=True)
+            except sqlite3.Error:
+                pass
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # A connection inherited from a parent process must not be reused
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def process_id():
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def publish(self, force=False):
+        """Write this process's snapshot, unless one was written recently."""
+        if not force and time.time() - self._published_at < self.publish_interval:
+            return
+        with self._publish_lock:
+            if not force and time.time() - self._published_at < self.publish_interval:
+                return
+            self._published_at = time.time()
+            self._connection().execute(
+                'INSERT OR REPLACE INTO metric_snapshots (process, updated, data) VALUES (?, ?, ?)',
+                (self.process_id(), self._published_at, json.dumps(self.registry.snapshot()))
+            )
+
+    def _is_gone(self, process, updated):
+        host, _, pid = process.rpartition(':')
+        if host != socket.gethostname():
+            return updated < time.time() - self.stale_seconds
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except (PermissionError, ValueError):
+            pass
+        return False
+
+    def render(self):
+        self.publish(force=True)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute('SELECT process, updated, data FROM metric_snapshots').fetchall()
+            snapshots = {process: json.loads(data) for process, _, data in rows}
+            gone = [process for process, updated, _ in rows
+                    if process != self.RETIRED and self._is_gone(process, updated)]
+            if gone:
+                retired = self.registry.combine(
+                    {process: snapshots.pop(process) for process in gone + [self.RETIRED] if process in snapshots}
+                )
+                snapshots[self.RETIRED] = retired
+                conn.executemany('DELETE FROM metric_snapshots WHERE process = ?', [(p,) for p in gone])
+                conn.execute(
+                    'INSERT OR REPLACE INTO metric_snapshots (process, updated, data) VALUES (?, ?, ?)',
+                    (self.RETIRED, time.time(), json.dumps(retired))
+                )
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return self.registry.render_merged(snapshots)
+
+
+class TimedProxy:
+    """Wrap an object so each call to one of its methods is timed into a histogram.
+
+    Only methods named in methods are timed; everything else passes through.
+    """
+
+    def __init__(self, target, histogram, methods, label='operation'):
+        self._target = target
+        self._histogram = histogram
+        self._methods = set(methods)
+        self._label = label
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name not in self._methods or not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            with self._histogram.time(**{self._label: name}):
+                return attr(*args, **kwargs)
+        return timed
@@ -0,0 +1,130 @@
+import io
+import os
+import textwrap
+
+# Output sizes: thumbnails for the calendar grid, full size for review
+SIZES = {
+    'thumb': (300, 300),
+    'full': (1080, 1080),
+}
+
+# Warm tones, matching what the AI preview prompt asks for
+DEFAULT_BRAND = {
+    'primary': '#c0392b',
+    'secondary': '#f39c12',
+    'text': '#ffffff',
+    'font': None,
+    'logo': None,
+}
+
+# Bump when the layout changes so cached renders are not reused
+RENDER_VERSION = 1
+
+FALLBACK_FONTS = ('DejaVuSans-Bold.ttf', 'Arial Bold.ttf', 'arialbd.ttf')
+
+
+def brand_for(client_data):
+    """Brand template for a client: its saved brand settings over the defaults."""
+    brand = dict(DEFAULT_BRAND)
+    brand.update({k: v for k, v in ((client_data or {}).get('brand') or {}).items() if v})
+    return brand
+
+
+def _hex_to_rgb(value):
+    value = value.lstrip('#')
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def _load_font(path, size):
+    from PIL import ImageFont
+    for candidate in ((path,) if path else ()) + FALLBACK_FONTS:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def _wrap(draw, text, font, max_width, max_lines):
+    """Wrap text to max_width pixels, ending with an ellipsis if it needs more than max_lines."""
+    average = max(1, draw.textlength('abcdefghijklmnopqrstuvwxyz', font=font) / 26)
+    lines = textwrap.wrap(text, width=max(8, int(max_width / average)))
+    if len(lines) > max_lines:
+        lines = lines[:max_lines]
+        lines[-1] = lines[-1].rstrip('.,;: ') + '…'
+    return lines
+
+
+def render_preview(post, client_name, brand, size='full'):
+    """Composite an entry's topic, description, hashtags and call to action onto the brand template.
+
+    Returns PNG bytes. Everything is scaled from the output size, so
+    thumbnails and full size renders share one layout.
+    """
+    from PIL import Image, ImageDraw
+    width, height = SIZES[size]
+    unit = width / 100
+    primary = _hex_to_rgb(brand['primary'])
+    secondary = _hex_to_rgb(brand['secondary'])
+    text_color = _hex_to_rgb(brand['text'])
+
+    # Vertical gradient from the primary color to a darker shade of it
+    image = Image.new('RGB', (1, 256))
+    image.putdata([tuple(int(c * (1 - 0.35 * y / 255)) for c in primary) for y in range(256)])
+    image = image.resize((width, height))
+    draw = ImageDraw.Draw(image)
+    margin = int(6 * unit)
+
+    # Header: logo if the client has one, otherwise the client name
+    header_bottom = margin + int(10 * unit)
+    logo_path = brand.get('logo')
+    if logo_path and os.path.exists(logo_path):
+        with Image.open(logo_path) as logo:
+            logo = logo.convert('RGBA')
+            logo.thumbnail((int(40 * unit), int(10 * unit)))
+            image.paste(logo, (margin, margin), logo)
+    else:
+        draw.text((margin, margin), client_name, fill=text_color, font=_load_font(brand.get('font'), int(5 * unit)))
+    draw.rectangle([margin, header_bottom, margin + int(12 * unit), header_bottom + max(1, int(0.8 * unit))], fill=secondary)
+
+    lines = (post.get('text_content') or '').split('\n', 1)
+    topic = lines[0].strip()
+    description = lines[1].strip() if len(lines) > 1 else ''
+    text_width = width - 2 * margin
+
+    y = header_bottom + int(6 * unit)
+    topic_font = _load_font(brand.get('font'), int(8 * unit))
+    for line in _wrap(draw, topic, topic_font, text_width, 3):
+        draw.text((margin, y), line, fill=text_color, font=topic_font)
+        y += int(10 * unit)
+
+    y += int(2 * unit)
+    body_font = _load_font(brand.get('font'), int(4.5 * unit))
+    for line in _wrap(draw, description, body_font, text_width, 5):
+        draw.text((margin, y), line, fill=text_color, font=body_font)
+        y += int(6 * unit)
+
+    # Call to action button and hashtags along the bottom
+    cta = (post.get('call_to_action') or '').strip()
+    hashtags = (post.get('hashtags') or '').strip()
+    hashtag_font = _load_font(brand.get('font'), int(3.5 * unit))
+    hashtag_lines = _wrap(draw, hashtags, hashtag_font, text_width, 2) if hashtags else []
+    bottom = height - margin - len(hashtag_lines) * int(5 * unit)
+    if cta:
+        cta_font = _load_font(brand.get('font'), int(4.5 * unit))
+        cta = _wrap(draw, cta, cta_font, text_width - int(6 * unit), 1)[0]
+        button_height = int(10 * unit)
+        button_width = int(draw.textlength(cta, font=cta_font)) + int(6 * unit)
+        top = bottom - button_height - int(3 * unit)
+        draw.rounded_rectangle(
+            [margin, top, margin + button_width, top + button_height], radius=int(2 * unit), fill=secondary
+        )
+        draw.text(
+            (margin + int(3 * unit), top + button_height // 2), cta, fill=text_color, font=cta_font, anchor='lm'
+        )
+    for i, line in enumerate(hashtag_lines):
+        draw.text((margin, bottom + i * int(5 * unit)), line, fill=secondary, font=hashtag_font)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=size == 'thumb')
+    return buffer.getvalue()
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+
+class SingleFlight:
+    """Coalesce identical work across threads and gunicorn workers.
+
+    The first caller for a key takes a lease on it in a SQLite table and
+    does the work; callers that arrive while it is running wait for it to
+    finish and share its result. Leases expire, so a worker that dies
+    mid-call only delays the others until the next caller takes over.
+    Only calls that overlap are coalesced: a caller never gets a result
+    that was finished before it started.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS flights (
+        key TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        lease_until REAL NOT NULL,
+        done_at REAL,
+        ok INTEGER NOT NULL DEFAULT 0,
+        result BLOB
+    );
+    """
+
+    def __init__(self, path='jobs.db', lease_seconds=180, poll_interval=0.05, max_poll_interval=0.5, keep_seconds=60,
+                 lead_context=None):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        # Called with the lease length; the leader runs fn inside the context manager it returns,
+        # e.g. to make its model calls give up before the lease runs out
+        self.lead_context = lead_context
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        # Finished flights are kept this long for callers still polling them
+        self.keep_seconds = keep_seconds
+        self._local = threading.local()
+        self._counters = {'led': 0, 'shared': 0, 'taken_over': 0}
+        self._counters_lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # A connection inherited from a parent process must not be reused
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _lead_context(self):
+        if self.lead_context is None:
+            return nullcontext()
+        return self.lead_context(self.lease_seconds)
+
+    def _count(self, name):
+        with self._counters_lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._counters_lock:
+            return dict(self._counters)
+
+    def _claim(self, key, owner, started):
+        """Return ('lead', None), ('wait', None) or ('done', row) for a caller that started at started."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute('SELECT lease_until, done_at, ok, result FROM flights WHERE key = ?', (key,)).fetchone()
+            if row is not None and row['done_at'] is not None and row['done_at'] >= started:
+                return 'done', row
+            if row is not None and row['done_at'] is None:
+                if row['lease_until'] >= now:
+                    return 'wait', None
+                self._count('taken_over')
+            conn.execute(
+                'INSERT OR REPLACE INTO flights (key, owner, lease_until, done_at, ok, result) '
+                'VALUES (?, ?, ?, NULL, 0, NULL)',
+                (key, owner, now + self.lease_seconds)
+            )
+            conn.execute('DELETE FROM flights WHERE done_at < ?', (now - self.keep_seconds,))
+        return 'lead', None
+
+    def _finish(self, key, owner, ok, result):
+        with self._transaction() as conn:
+            # A no-op if the lease ran out and another caller took the key over
+            conn.execute(
+                'UPDATE flights SET done_at = ?, ok = ?, result = ? WHERE key = ? AND owner = ?',
+                (time.time(), 1 if ok else 0, result, key, owner)
+            )
+
+    def do(self, key, fn, lookup=None):
+        """Return fn(), running it once for all concurrent callers with the same key.
+
+        fn returns bytes, a string or None (failure, which waiting callers
+        share too). With lookup, the result is not stored in the table:
+        fn must leave it where lookup() finds it, such as a disk cache, and
+        waiting callers (and a leader that finds it already there) return
+        lookup() instead.
+        """
+        started = time.time()
+        owner = uuid.uuid4().hex
+        delay = self.poll_interval
+        while True:
+            state, row = self._claim(key, owner, started)
+            if state == 'lead':
+                break
+            if state == 'done':
+                self._count('shared')
+                if not row['ok']:
+                    return None
+                return lookup() if lookup else row['result']
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+
+        self._count('led')
+        try:
+            value = lookup() if lookup else None
+            if value is None:
+                with self._lead_context():
+                    value = fn()
+        except Exception:
+            self._finish(key, owner, False, None)
+            raise
+        self._finish(key, owner, value is not None, None if lookup else value)
+        return value
+
+    async def do_async(self, key, fn, lookup=None):
+        """do() for a coroutine function. Flights are shared with synchronous callers of the same key.
+
+        The table is read and written from a worker thread, so waiting
+        never blocks the event loop.
+        """
+        started = time.time()
+        owner = uuid.uuid4().hex
+        delay = self.poll_interval
+        while True:
+            state, row = await asyncio.to_thread(self._claim, key, owner, started)
+            if state == 'lead':
+                break
+            if state == 'done':
+                self._count('shared')
+                if not row['ok']:
+                    return None
+                return lookup() if lookup else row['result']
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+
+        self._count('led')
+        try:
+            value = lookup() if lookup else None
+            if value is None:
+                with self._lead_context():
+                    value = await fn()
+        except BaseException:
+            # Includes cancellation: waiting callers get None now rather than after the lease
+            self._finish(key, owner, False, None)
+            raise
+        await asyncio.to_thread(self._finish, key, owner, value is not None, None if lookup else value)
+        return value
@@ -0,0 +1,999 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+
+class EntryNotFound(LookupError):
+    """No calendar entry has the given id."""
+
+
+class VersionConflict(Exception):
+    """An entry was changed since the caller read it. entry holds its current state."""
+
+    def __init__(self, entry):
+        super().__init__(f"Entry {entry['id']} is at version {entry['version']}")
+        self.entry = entry
+
+
+# Keys added to entries on read; they are stored as columns, not in the entry data
+ENTRY_META = ('id', 'version')
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True)
+
+
+def _entry_data(entry):
+    return {k: v for k, v in entry.items() if k not in ENTRY_META}
+
+
+def _empty_data():
+    return {"clients": {}, "projects": {}}
+
+
+def _entry_matches(entry, month=None, channel=None, status=None):
+    if month and not (entry.get('date') or '').startswith(f"{month}-"):
+        return False
+    if channel and (entry.get('channel') or '').lower() != channel.lower():
+        return False
+    if status and (entry.get('status') or '').lower() != status.lower():
+        return False
+    return True
+
+
+# client_summaries sort keys -> summary table column
+SUMMARY_SORTS = {
+    'name': 'name',
+    'month': 'target_month',
+    'posts': 'num_posts',
+    'entries': 'entry_count',
+    'status': 'status',
+    'updated': 'updated_at',
+}
+
+
+# Entry fields indexed for full-text search, and the fields search results can be filtered and counted by
+SEARCH_FIELDS = ('text_content', 'hashtags', 'call_to_action', 'channel', 'content_type', 'status', 'approval')
+SEARCH_FACETS = ('project', 'month', 'channel', 'content_type', 'status', 'approval')
+FACET_LIMIT = 20
+
+
+def _search_terms(text):
+    """Split a search string into lowercase word terms; a trailing * makes a term a prefix."""
+    return [term.lower() for term in re.findall(r'\w+\*?', text or '')]
+
+
+def _client_summary(name, client_data, entry_count, updated_at):
+    """The fields a client list needs, without calendar bodies or image insights."""
+    return {
+        'name': name,
+        'targetMonth': client_data.get('targetMonth'),
+        'platforms': client_data.get('platforms') or [],
+        'numPosts': client_data.get('numPosts') or 0,
+        'numReels': client_data.get('numReels') or 0,
+        'status': client_data.get('status') or 'ready',
+        'jobId': client_data.get('jobId'),
+        'entries': entry_count,
+        'updatedAt': updated_at,
+    }
+
+
+def _is_reviewed(entry):
+    """Whether someone has edited or approved an entry since it was generated."""
+    return entry.get('version', 1) > 1 or (entry.get('approval') or 'pending').lower() != 'pending'
+
+
+def _entry_slot(entry):
+    return (entry.get('date'), (entry.get('channel') or '').lower(), (entry.get('content_type') or '').lower())
+
+
+def _merge_month(existing, entries):
+    """Split a month's merge into (entries to remove, entries to add).
+
+    Unreviewed entries give way to the new ones. Reviewed entries stay,
+    and new entries for the slot (date, channel, content type) one of
+    them holds are dropped.
+    """
+    held = {_entry_slot(entry) for entry in existing if _is_reviewed(entry)}
+    removed = [entry for entry in existing if not _is_reviewed(entry)]
+    return removed, [entry for entry in entries if _entry_slot(entry) not in held]
+
+
+def _assign_entry_ids(data, derived=False):
+    """Give entries without one an id and version.
+
+    With derived, the id comes from the entry's project and position, so
+    reads of a file written before entries had ids agree on them until
+    the next write stores them.
+    """
+    for name, project_data in data['projects'].items():
+        for position, entry in enumerate(project_data.get('calendar_entries', [])):
+            if 'id' not in entry:
+                if derived:
+                    entry['id'] = uuid.uuid5(uuid.NAMESPACE_URL, f"{name}#{position}").hex
+                else:
+                    entry['id'] = uuid.uuid4().hex
+                entry['version'] = 1
+
+
+class JSONStorage:
+    """Original whole-file backend, kept for local development and rollback."""
+
+    def __init__(self, path='data.json'):
+        self.path = path
+        self._lock = threading.RLock()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return _empty_data()
+        # Ensure required keys exist
+        data.setdefault('clients', {})
+        data.setdefault('projects', {})
+        # Reads never write; entries from older files keep these ids from their next write on
+        _assign_entry_ids(data, derived=True)
+        return data
+
+    def save(self, data):
+        _assign_entry_ids(data)
+        # Write to a temp file first so readers never see a half-written file
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.data-', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    @contextmanager
+    def transaction(self):
+        # Each write is atomic on its own; this only serializes callers in this process
+        with self._lock:
+            yield self
+
+    @contextmanager
+    def _update(self):
+        with self._lock:
+            data = self.load()
+            yield data
+            self.save(data)
+
+    def is_empty(self):
+        data = self.load()
+        return not data['clients'] and not data['projects']
+
+    def get_revision(self, project):
+        """Change marker for cache validation; the whole file counts as one revision."""
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def client_names(self):
+        return list(self.load()['clients'].keys())
+
+    def get_client(self, name):
+        return self.load()['clients'].get(name)
+
+    def generating_clients(self):
+        """Map of client name -> job id for clients whose calendar is still being generated."""
+        return {
+            name: client_data.get('jobId')
+            for name, client_data in self.load()['clients'].items()
+            if client_data.get('status') == 'generating'
+        }
+
+    def client_summaries(self, sort='name', descending=False, limit=50, offset=0, query=None, status=None):
+        """Return (total, summaries) for one page of clients; see SQLiteStorage.client_summaries.
+
+        The file has no index, so this reads it whole; use the SQLite backend for large client lists.
+        """
+        data = self.load()
+        updated_at = os.stat(self.path).st_mtime if os.path.exists(self.path) else None
+        summaries = [
+            _client_summary(name, client_data, len(data['projects'].get(name, {}).get('calendar_entries', [])), updated_at)
+            for name, client_data in data['clients'].items()
+            if (not query or query.lower() in name.lower()) and (not status or (client_data.get('status') or 'ready') == status)
+        ]
+        key = {'month': 'targetMonth', 'posts': 'numPosts', 'entries': 'entries', 'updated': 'updatedAt'}.get(sort, sort)
+        summaries.sort(key=lambda s: s['name'])
+        summaries.sort(key=lambda s: (s[key] is None, s[key] if s[key] is not None else 0), reverse=descending)
+        return len(summaries), summaries[offset:offset + limit]
+
+    def put_client(self, name, client_data):
+        with self._update() as data:
+            data['clients'][name] = client_data
+
+    def create_client(self, name, client_data, project_data=None, entries=None):
+        """Insert a client and its project. Returns False if it already exists."""
+        with self._update() as data:
+            if name in data['clients']:
+                return False
+            data['clients'][name] = client_data
+            data['projects'][name] = dict(project_data or {}, calendar_entries=list(entries or []))
+            return True
+
+    def get_project(self, name):
+        return self.load()['projects'].get(name)
+
+    def replace_entries(self, project, entries):
+        with self._update() as data:
+            data['projects'].setdefault(project, {})['calendar_entries'] = entries
+
+    def materialize_calendar(self, project, entries, version):
+        """Store generated entries once per calendar version. Returns False if already done."""
+        with self._update() as data:
+            project_data = data['projects'].setdefault(project, {})
+            if project_data.get('calendar_version') == version:
+                return False
+            project_data['calendar_entries'] = entries
+            project_data['calendar_version'] = version
+            return True
+
+    def add_entry(self, project, entry):
+        with self._update() as data:
+            project_data = data['projects'].setdefault(project, {"calendar_entries": []})
+            project_data.setdefault('calendar_entries', []).append(entry)
+
+    def update_entry(self, project, index, entry):
+        """Replace the entry at index. Returns the previous entry, or None if missing."""
+        with self._update() as data:
+            entries = data['projects'].get(project, {}).get('calendar_entries', [])
+            if not 0 <= index < len(entries):
+                return None
+            previous = entries[index]
+            entries[index] = dict(_entry_data(entry), id=previous['id'], version=previous['version'] + 1)
+            return previous
+
+    def delete_entry(self, project, index):
+        """Remove the entry at index. Returns the removed entry, or None if missing."""
+        with self._update() as data:
+            entries = data['projects'].get(project, {}).get('calendar_entries', [])
+            if not 0 <= index < len(entries):
+                return None
+            return entries.pop(index)
+
+    def delete_project(self, name):
+        with self._update() as data:
+            data['clients'].pop(name, None)
+            data['projects'].pop(name, None)
+
+    def patch_entries(self, changes):
+        """Apply (entry_id, expected_version, fields) changes all-or-nothing in one write.
+
+        Returns (project, previous, updated) for each change. Raises
+        EntryNotFound or VersionConflict, leaving every entry unchanged.
+        An expected_version of None skips the version check.
+        """
+        results = []
+        with self._update() as data:
+            by_id = {
+                entry['id']: (name, entry)
+                for name, project_data in data['projects'].items()
+                for entry in project_data.get('calendar_entries', [])
+            }
+            for entry_id, version, fields in changes:
+                if str(entry_id) not in by_id:
+                    raise EntryNotFound(entry_id)
+                project, entry = by_id[str(entry_id)]
+                if version is not None and version != entry['version']:
+                    raise VersionConflict(dict(entry))
+                previous = dict(entry)
+                entry.update(_entry_data(fields))
+                entry['version'] += 1
+                results.append((project, previous, dict(entry)))
+        return results
+
+    def remove_entry(self, entry_id, version=None):
+        """Delete an entry by id. Returns (project, removed); raises EntryNotFound or VersionConflict."""
+        with self._update() as data:
+            for name, project_data in data['projects'].items():
+                entries = project_data.get('calendar_entries', [])
+                for index, entry in enumerate(entries):
+                    if entry['id'] == str(entry_id):
+                        if version is not None and version != entry['version']:
+                            raise VersionConflict(dict(entry))
+                        return name, entries.pop(index)
+        raise EntryNotFound(entry_id)
+
+    def merge_month(self, project, month, entries):
+        """Merge generated entries into a project's month (YYYY-MM); see SQLiteStorage.merge_month."""
+        with self._update() as data:
+            project_data = data['projects'].setdefault(project, {})
+            current = project_data.get('calendar_entries', [])
+            removed, added = _merge_month([e for e in current if (e.get('date') or '').startswith(month)], entries)
+            removed_ids = {entry['id'] for entry in removed}
+            kept = [entry for entry in current if entry['id'] not in removed_ids]
+            project_data['calendar_entries'] = sorted(kept + list(added), key=lambda e: e.get('date') or '')
+        return len(added), len(entries) - len(added)
+
+    def search_entries(self, text=None, projects=None, limit=50, offset=0, **filters):
+        """Search entries across projects; see SQLiteStorage.search_entries.
+
+        The file has no index, so every search reads and scans it whole.
+        """
+        terms = _search_terms(text)
+        matches = []
+        for name, project_data in self.load()['projects'].items():
+            if projects and name not in projects:
+                continue
+            for entry in project_data.get('calendar_entries', []):
+                values = dict(
+                    {field: str(entry.get(field) or '') for field in SEARCH_FACETS[2:]},
+                    project=name,
+                    month=(entry.get('date') or '')[:7]
+                )
+                if any(value and values[field].lower() != value.lower() for field, value in filters.items()):
+                    continue
+                if terms:
+                    words = set(_search_terms(' '.join(str(entry.get(field) or '') for field in SEARCH_FIELDS)))
+                    if not all(any(word.startswith(term[:-1]) for word in words) if term.endswith('*') else term in words
+                               for term in terms):
+                        continue
+                matches.append((name, entry, values))
+        matches.sort(key=lambda match: (match[1].get('date') or '', match[0]))
+        facets = {}
+        for facet in SEARCH_FACETS:
+            counts = {}
+            for _, _, values in matches:
+                counts[values[facet]] = counts.get(values[facet], 0) + 1
+            facets[facet] = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:FACET_LIMIT]
+        return {
+            'total': len(matches),
+            'results': [(name, entry) for name, entry, _ in matches[offset:offset + limit]],
+            'facets': facets,
+        }
+
+    def iter_entries(self, projects=None, month=None, channel=None, status=None):
+        """Yield (project, entry) pairs matching the filters, by project then date."""
+        data = self.load()
+        names = sorted(data['projects']) if projects is None else [p for p in projects if p in data['projects']]
+        for name in names:
+            entries = data['projects'][name].get('calendar_entries', [])
+            for entry in sorted(entries, key=lambda e: e.get('date') or ''):
+                if _entry_matches(entry, month, channel, status):
+                    yield name, entry
+
+
+class SQLiteStorage:
+    """SQLite backend with one row per client, project and calendar entry.
+
+    Entries keep their list order through a position column, so the
+    index-based routes keep working while single-entry writes only touch
+    one row inside a transaction.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS clients (
+        name TEXT PRIMARY KEY,
+        data TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS projects (
+        name TEXT PRIMARY KEY,
+        data TEXT NOT NULL DEFAULT '{}',
+        revision INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        project TEXT NOT NULL REFERENCES projects(name) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        date TEXT,
+        data TEXT NOT NULL,
+        version INTEGER NOT NULL DEFAULT 1
+    );
+    CREATE INDEX IF NOT EXISTS idx_entries_project_date ON entries(project, date);
+    CREATE INDEX IF NOT EXISTS idx_entries_project_position ON entries(project, position);
+    CREATE TABLE IF NOT EXISTS client_summaries (
+        name TEXT PRIMARY KEY,
+        target_month TEXT,
+        platforms TEXT NOT NULL DEFAULT '[]',
+        num_posts INTEGER NOT NULL DEFAULT 0,
+        num_reels INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'ready',
+        job_id TEXT,
+        entry_count INTEGER NOT NULL DEFAULT 0,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_client_summaries_status ON client_summaries(status);
+    CREATE INDEX IF NOT EXISTS idx_client_summaries_updated ON client_summaries(updated_at);
+    CREATE TABLE IF NOT EXISTS entry_facets (
+        id INTEGER PRIMARY KEY,
+        project TEXT NOT NULL,
+        date TEXT,
+        month TEXT,
+        channel TEXT COLLATE NOCASE,
+        content_type TEXT COLLATE NOCASE,
+        status TEXT COLLATE NOCASE,
+        approval TEXT COLLATE NOCASE
+    );
+    CREATE INDEX IF NOT EXISTS idx_entry_facets_project ON entry_facets(project);
+    CREATE INDEX IF NOT EXISTS idx_entry_facets_month ON entry_facets(month);
+    CREATE INDEX IF NOT EXISTS idx_entry_facets_channel ON entry_facets(channel);
+    CREATE INDEX IF NOT EXISTS idx_entry_facets_content_type ON entry_facets(content_type);
+    CREATE INDEX IF NOT EXISTS idx_entry_facets_status ON entry_facets(status);
+    CREATE INDEX IF NOT EXISTS idx_entry_facets_approval ON entry_facets(approval);
+    CREATE INDEX IF NOT EXISTS idx_entry_facets_date ON entry_facets(date, project);
+    CREATE TRIGGER IF NOT EXISTS entries_facets_insert AFTER INSERT ON entries BEGIN
+        INSERT OR REPLACE INTO entry_facets (id, project, date, month, channel, content_type, status, approval)
+        VALUES (new.id, new.project, new.date, substr(new.date, 1, 7), json_extract(new.data, '$.channel'),
+                json_extract(new.data, '$.content_type'), json_extract(new.data, '$.status'),
+                json_extract(new.data, '$.approval'));
+    END;
+    CREATE TRIGGER IF NOT EXISTS entries_facets_update AFTER UPDATE OF project, date, data ON entries BEGIN
+        INSERT OR REPLACE INTO entry_facets (id, project, date, month, channel, content_type, status, approval)
+        VALUES (new.id, new.project, new.date, substr(new.date, 1, 7), json_extract(new.data, '$.channel'),
+                json_extract(new.data, '$.content_type'), json_extract(new.data, '$.status'),
+                json_extract(new.data, '$.approval'));
+    END;
+    CREATE TRIGGER IF NOT EXISTS entries_facets_delete AFTER DELETE ON entries BEGIN
+        DELETE FROM entry_facets WHERE id = old.id;
+    END;
+    """
+
+    # Full-text index over SEARCH_FIELDS, keyed by entry id. Needs SQLite built with FTS5;
+    # without it, text search falls back to scanning entry data.
+    FTS_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+        text_content, hashtags, call_to_action, channel, content_type, status, approval,
+        tokenize = 'unicode61 remove_diacritics 2'
+    );
+    CREATE TRIGGER IF NOT EXISTS entries_fts_insert AFTER INSERT ON entries BEGIN
+        INSERT INTO entries_fts (rowid, text_content, hashtags, call_to_action, channel, content_type, status, approval)
+        VALUES (new.id, json_extract(new.data, '$.text_content'), json_extract(new.data, '$.hashtags'),
+                json_extract(new.data, '$.call_to_action'), json_extract(new.data, '$.channel'),
+                json_extract(new.data, '$.content_type'), json_extract(new.data, '$.status'),
+                json_extract(new.data, '$.approval'));
+    END;
+    CREATE TRIGGER IF NOT EXISTS entries_fts_update AFTER UPDATE OF data ON entries BEGIN
+        DELETE FROM entries_fts WHERE rowid = old.id;
+        INSERT INTO entries_fts (rowid, text_content, hashtags, call_to_action, channel, content_type, status, approval)
+        VALUES (new.id, json_extract(new.data, '$.text_content'), json_extract(new.data, '$.hashtags'),
+                json_extract(new.data, '$.call_to_action'), json_extract(new.data, '$.channel'),
+                json_extract(new.data, '$.content_type'), json_extract(new.data, '$.status'),
+                json_extract(new.data, '$.approval'));
+    END;
+    CREATE TRIGGER IF NOT EXISTS entries_fts_delete AFTER DELETE ON entries BEGIN
+        DELETE FROM entries_fts WHERE rowid = old.id;
+    END;
+    """
+
+    def __init__(self, path='data.db'):
+        self.path = path
+        self._local = threading.local()
+        # executescript manages its own transaction
+        self._connection().executescript(self.SCHEMA)
+        try:
+            self._connection().executescript(self.FTS_SCHEMA)
+            self.full_text = True
+        except sqlite3.OperationalError:
+            self.full_text = False
+        self._migrate()
+
+    def _migrate(self):
+        """Bring databases created by older versions up to the current schema."""
+        with self.transaction() as conn:
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(projects)')}
+            if 'revision' not in columns:
+                conn.execute('ALTER TABLE projects ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(entries)')}
+            if 'version' not in columns:
+                conn.execute('ALTER TABLE entries ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+            # Databases from before the summary index get it built once
+            counts = conn.execute(
+                'SELECT (SELECT COUNT(*) FROM clients), (SELECT COUNT(*) FROM client_summaries)'
+            ).fetchone()
+            if counts[0] != counts[1]:
+                self._rebuild_summaries(conn)
+            # Likewise the search index, for entries written before it existed
+            counts = conn.execute('SELECT (SELECT COUNT(*) FROM entries), (SELECT COUNT(*) FROM entry_facets)').fetchone()
+            stale = counts[0] != counts[1]
+            if self.full_text and not stale:
+                stale = conn.execute('SELECT COUNT(*) FROM entries_fts').fetchone()[0] != counts[0]
+            if stale:
+                self._rebuild_search(conn)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # Connections opened before a fork (gunicorn --preload) must not be shared with workers
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run a block in a write transaction shared safely across worker processes."""
+        conn = self._connection()
+        if conn.in_transaction:
+            # Nested use joins the outer transaction
+            yield conn
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    # Whole-document access, used by load_data/save_data
+
+    def load(self):
+        conn = self._connection()
+        data = _empty_data()
+        for row in conn.execute('SELECT name, data FROM clients'):
+            data['clients'][row['name']] = json.loads(row['data'])
+        for row in conn.execute('SELECT name, data FROM projects'):
+            project_data = json.loads(row['data'])
+            project_data['calendar_entries'] = []
+            data['projects'][row['name']] = project_data
+        for row in conn.execute('SELECT project, data FROM entries ORDER BY project, position'):
+            data['projects'][row['project']]['calendar_entries'].append(json.loads(row['data']))
+        return data
+
+    def save(self, data):
+        """Sync a whole document, rewriting only the rows that changed."""
+        with self.transaction() as conn:
+            existing = {row['name']: row['data'] for row in conn.execute('SELECT name, data FROM clients')}
+            for name, client_data in data.get('clients', {}).items():
+                serialized = _dumps(client_data)
+                if existing.pop(name, None) != serialized:
+                    conn.execute('INSERT OR REPLACE INTO clients (name, data) VALUES (?, ?)', (name, serialized))
+            for name in existing:
+                conn.execute('DELETE FROM clients WHERE name = ?', (name,))
+
+            existing = {row['name']: row['data'] for row in conn.execute('SELECT name, data FROM projects')}
+            for name, project_data in data.get('projects', {}).items():
+                project_fields = {k: v for k, v in project_data.items() if k != 'calendar_entries'}
+                if existing.pop(name, None) != _dumps(project_fields):
+                    self._put_project(conn, name, project_fields)
+                    self._touch(conn, name)
+                entries = project_data.get('calendar_entries', [])
+                if [_dumps(_entry_data(e)) for e in entries] != self._entry_rows(conn, name):
+                    self._write_entries(conn, name, entries)
+            for name in existing:
+                conn.execute('DELETE FROM projects WHERE name = ?', (name,))
+            self._rebuild_summaries(conn)
+
+    # Granular operations, used by the routes
+
+    def is_empty(self):
+        conn = self._connection()
+        return (conn.execute('SELECT 1 FROM clients LIMIT 1').fetchone() is None
+                and conn.execute('SELECT 1 FROM projects LIMIT 1').fetchone() is None)
+
+    def get_revision(self, project):
+        """Counter bumped on every change to a project's entries, or None if it doesn't exist."""
+        row = self._connection().execute('SELECT revision FROM projects WHERE name = ?', (project,)).fetchone()
+        return row['revision'] if row else None
+
+    def client_names(self):
+        return [row['name'] for row in self._connection().execute('SELECT name FROM clients ORDER BY rowid')]
+
+    def get_client(self, name):
+        row = self._connection().execute('SELECT data FROM clients WHERE name = ?', (name,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def generating_clients(self):
+        """Map of client name -> job id for clients whose calendar is still being generated."""
+        return {row['name']: row['job_id'] for row in self._connection().execute(
+            "SELECT name, job_id FROM client_summaries WHERE status = 'generating'"
+        )}
+
+    def client_summaries(self, sort='name', descending=False, limit=50, offset=0, query=None, status=None):
+        """Return (total, summaries) for one page of clients, read from the summary index only.
+
+        sort is a key of SUMMARY_SORTS; query matches part of the name.
+        """
+        conditions = []
+        params = []
+        if query:
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            params.append('%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if status:
+            conditions.append('status = ?')
+            params.append(status)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        conn = self._connection()
+        total = conn.execute(f'SELECT COUNT(*) FROM client_summaries {where}', params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM client_summaries {where} "
+            f"ORDER BY {SUMMARY_SORTS[sort]} {'DESC' if descending else 'ASC'}, name LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        ).fetchall()
+        return total, [{
+            'name': row['name'],
+            'targetMonth': row['target_month'],
+            'platforms': json.loads(row['platforms']),
+            'numPosts': row['num_posts'],
+            'numReels': row['num_reels'],
+            'status': row['status'],
+            'jobId': row['job_id'],
+            'entries': row['entry_count'],
+            'updatedAt': row['updated_at'],
+        } for row in rows]
+
+    def put_client(self, name, client_data):
+        with self.transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO clients (name, data) VALUES (?, ?)', (name, _dumps(client_data)))
+            self._put_summary(conn, name, client_data)
+
+    def create_client(self, name, client_data, project_data=None, entries=None):
+        """Insert a client and its project. Returns False if it already exists."""
+        with self.transaction() as conn:
+            if conn.execute('SELECT 1 FROM clients WHERE name = ?', (name,)).fetchone():
+                return False
+            conn.execute('INSERT INTO clients (name, data) VALUES (?, ?)', (name, _dumps(client_data)))
+            self._put_project(conn, name, project_data or {})
+            self._write_entries(conn, name, entries or [])
+            self._put_summary(conn, name, client_data)
+            return True
+
+    def get_project(self, name):
+        conn = self._connection()
+        row = conn.execute('SELECT data FROM projects WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        project_data = json.loads(row['data'])
+        project_data['calendar_entries'] = [self._entry_record(row) for row in conn.execute(
+            'SELECT id, version, data FROM entries WHERE project = ? ORDER BY position', (name,)
+        )]
+        return project_data
+
+    def replace_entries(self, project, entries):
+        with self.transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO projects (name) VALUES (?)', (project,))
+            self._write_entries(conn, project, entries)
+
+    def materialize_calendar(self, project, entries, version):
+        """Store generated entries once per calendar version. Returns False if already done."""
+        with self.transaction() as conn:
+            row = conn.execute('SELECT data FROM projects WHERE name = ?', (project,)).fetchone()
+            project_data = json.loads(row['data']) if row else {}
+            if project_data.get('calendar_version') == version:
+                return False
+            project_data['calendar_version'] = version
+            self._put_project(conn, project, project_data)
+            self._write_entries(conn, project, entries)
+            return True
+
+    def add_entry(self, project, entry):
+        with self.transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO projects (name) VALUES (?)', (project,))
+            position = conn.execute(
+                'SELECT COALESCE(MAX(position), -1) + 1 FROM entries WHERE project = ?', (project,)
+            ).fetchone()[0]
+            conn.execute(
+                'INSERT INTO entries (project, position, date, data) VALUES (?, ?, ?, ?)',
+                (project, position, entry.get('date'), _dumps(_entry_data(entry)))
+            )
+            self._touch(conn, project)
+
+    def update_entry(self, project, index, entry):
+        """Replace the entry at index. Returns the previous entry, or None if missing."""
+        with self.transaction() as conn:
+            row = self._entry_at(conn, project, index)
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE entries SET date = ?, data = ?, version = version + 1 WHERE id = ?',
+                (entry.get('date'), _dumps(_entry_data(entry)), row['id'])
+            )
+            self._touch(conn, project)
+            return self._entry_record(row)
+
+    def delete_entry(self, project, index):
+        """Remove the entry at index. Returns the removed entry, or None if missing."""
+        with self.transaction() as conn:
+            row = self._entry_at(conn, project, index)
+            if row is None:
+                return None
+            conn.execute('DELETE FROM entries WHERE id = ?', (row['id'],))
+            self._touch(conn, project)
+            return self._entry_record(row)
+
+    def delete_project(self, name):
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM clients WHERE name = ?', (name,))
+            conn.execute('DELETE FROM projects WHERE name = ?', (name,))
+            conn.execute('DELETE FROM client_summaries WHERE name = ?', (name,))
+
+    def patch_entries(self, changes):
+        """Apply (entry_id, expected_version, fields) changes all-or-nothing in one transaction.
+
+        Returns (project, previous, updated) for each change. Raises
+        EntryNotFound or VersionConflict, rolling every change back.
+        An expected_version of None skips the version check.
+        """
+        results = []
+        with self.transaction() as conn:
+            for entry_id, version, fields in changes:
+                row = conn.execute(
+                    'SELECT id, project, version, data FROM entries WHERE id = ?', (entry_id,)
+                ).fetchone()
+                if row is None:
+                    raise EntryNotFound(entry_id)
+                previous = self._entry_record(row)
+                if version is not None and version != row['version']:
+                    raise VersionConflict(previous)
+                data = dict(_entry_data(previous), **_entry_data(fields))
+                conn.execute(
+                    'UPDATE entries SET date = ?, data = ?, version = version + 1 WHERE id = ?',
+                    (data.get('date'), _dumps(data), row['id'])
+                )
+                results.append((row['project'], previous, dict(data, id=row['id'], version=row['version'] + 1)))
+            for project in {project for project, _, _ in results}:
+                self._touch(conn, project)
+        return results
+
+    def remove_entry(self, entry_id, version=None):
+        """Delete an entry by id. Returns (project, removed); raises EntryNotFound or VersionConflict."""
+        with self.transaction() as conn:
+            row = conn.execute(
+                'SELECT id, project, version, data FROM entries WHERE id = ?', (entry_id,)
+            ).fetchone()
+            if row is None:
+                raise EntryNotFound(entry_id)
+            removed = self._entry_record(row)
+            if version is not None and version != row['version']:
+                raise VersionConflict(removed)
+            conn.execute('DELETE FROM entries WHERE id = ?', (row['id'],))
+            self._touch(conn, row['project'])
+            return row['project'], removed
+
+    def merge_month(self, project, month, entries):
+        """Merge generated entries into a project's month (YYYY-MM), in date order.
+
+        Entries someone has edited (version above 1) or approved or rejected
+        are never overwritten: they stay, and generated entries for their
+        date, channel and content type are dropped. The month's other
+        entries are replaced, and other months are left alone. Returns
+        (added, skipped) counts of the generated entries.
+        """
+        with self.transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO projects (name) VALUES (?)', (project,))
+            existing = [dict(json.loads(row['data']), id=row['id'], version=row['version']) for row in conn.execute(
+                'SELECT id, version, data FROM entries WHERE project = ? AND date LIKE ?', (project, f"{month}-%")
+            )]
+            removed, added = _merge_month(existing, entries)
+            conn.executemany('DELETE FROM entries WHERE id = ?', [(entry['id'],) for entry in removed])
+            conn.executemany(
+                'INSERT INTO entries (project, position, date, data) VALUES (?, 0, ?, ?)',
+                [(project, entry.get('date'), _dumps(_entry_data(entry))) for entry in added]
+            )
+            # Renumber so index-based routes see the same order as the calendar
+            ids = [row['id'] for row in conn.execute(
+                'SELECT id FROM entries WHERE project = ? ORDER BY date, position, id', (project,)
+            )]
+            conn.executemany('UPDATE entries SET position = ? WHERE id = ?', list(enumerate(ids)))
+            self._touch(conn, project)
+        return len(added), len(entries) - len(added)
+
+    def search_entries(self, text=None, projects=None, limit=50, offset=0, **filters):
+        """Find entries by full text and facet filters across all projects.
+
+        text is matched word by word against SEARCH_FIELDS (every word must
+        match; a trailing * matches a prefix). filters are exact,
+        case-insensitive matches on month, channel, content_type, status
+        and approval. Returns {'total', 'results': [(project, entry)],
+        'facets': {facet: [(value, count)]}}, with facet counts over all
+        matching entries.
+        """
+        conn = self._connection()
+        conditions = []
+        params = []
+        terms = _search_terms(text)
+        if terms and self.full_text:
+            # Match once into a per-connection temp table instead of once per count and facet query
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS search_hits (id INTEGER PRIMARY KEY)')
+            conn.execute('DELETE FROM search_hits')
+            conn.execute(
+                'INSERT INTO search_hits SELECT rowid FROM entries_fts WHERE entries_fts MATCH ?',
+                (' '.join(f'"{term.rstrip("*")}"' + ('*' if term.endswith('*') else '') for term in terms),)
+            )
+            conditions.append('f.id IN (SELECT id FROM search_hits)')
+        elif terms:
+            for term in terms:
+                conditions.append('f.id IN (SELECT id FROM entries WHERE data LIKE ?)')
+                params.append(f"%{term.rstrip('*')}%")
+        if projects:
+            conditions.append(f"f.project IN ({', '.join('?' * len(projects))})")
+            params.extend(projects)
+        for field, value in filters.items():
+            if field not in SEARCH_FACETS:
+                raise ValueError(f"Cannot filter by {field}")
+            conditions.append(f"f.{field} = ?")
+            params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        total = conn.execute(f'SELECT COUNT(*) FROM entry_facets f {where}', params).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT f.project, e.id, e.version, e.data FROM entry_facets f JOIN entries e ON e.id = f.id '
+            f'{where} ORDER BY f.date, f.project, e.position LIMIT ? OFFSET ?',
+            params + [limit, offset]
+        ).fetchall()
+        facets = {
+            facet: [(row[0], row[1]) for row in conn.execute(
+                f'SELECT f.{facet}, COUNT(*) AS n FROM entry_facets f {where} '
+                f'GROUP BY f.{facet} ORDER BY n DESC, f.{facet} LIMIT ?',
+                params + [FACET_LIMIT]
+            )]
+            for facet in SEARCH_FACETS
+        } if total else {facet: [] for facet in SEARCH_FACETS}
+        return {
+            'total': total,
+            'results': [(row['project'], self._entry_record(row)) for row in rows],
+            'facets': facets,
+        }
+
+    def iter_entries(self, projects=None, month=None, channel=None, status=None, batch_size=500):
+        """Yield (project, entry) pairs matching the filters, by project then date.
+
+        Rows are fetched in batches from a cursor, so memory use does not
+        grow with the number of entries exported.
+        """
+        clauses = []
+        params = []
+        if projects is not None:
+            if not projects:
+                return
+            clauses.append(f"project IN ({', '.join('?' * len(projects))})")
+            params.extend(projects)
+        if month:
+            clauses.append('date LIKE ?')
+            params.append(f"{month}-%")
+        if channel:
+            clauses.append("LOWER(json_extract(data, '$.channel')) = LOWER(?)")
+            params.append(channel)
+        if status:
+            clauses.append("LOWER(json_extract(data, '$.status')) = LOWER(?)")
+            params.append(status)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        cursor = self._connection().execute(
+            f'SELECT project, data FROM entries {where} ORDER BY project, date, position', params
+        )
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield row['project'], json.loads(row['data'])
+        finally:
+            cursor.close()
+
+    def import_json(self, path):
+        """One-shot import of a data.json file. Returns (clients, entries) imported."""
+        data = JSONStorage(path).load()
+        self.save(data)
+        num_entries = sum(len(p.get('calendar_entries', [])) for p in data['projects'].values())
+        return len(data['clients']), num_entries
+
+    # Helpers
+
+    @staticmethod
+    def _entry_record(row):
+        return dict(json.loads(row['data']), id=row['id'], version=row['version'])
+
+    @staticmethod
+    def _entry_at(conn, project, index):
+        if index < 0:
+            return None
+        return conn.execute(
+            'SELECT id, version, data FROM entries WHERE project = ? ORDER BY position LIMIT 1 OFFSET ?',
+            (project, index)
+        ).fetchone()
+
+    @staticmethod
+    def _entry_rows(conn, project):
+        return [row['data'] for row in conn.execute(
+            'SELECT data FROM entries WHERE project = ? ORDER BY position', (project,)
+        )]
+
+    @staticmethod
+    def _touch(conn, project):
+        conn.execute('UPDATE projects SET revision = revision + 1 WHERE name = ?', (project,))
+        conn.execute(
+            'UPDATE client_summaries SET entry_count = (SELECT COUNT(*) FROM entries WHERE project = ?), '
+            'updated_at = ? WHERE name = ?',
+            (project, time.time(), project)
+        )
+
+    @staticmethod
+    def _put_summary(conn, name, client_data):
+        """Write a client's row in the summary index; called by every client write."""
+        entry_count = conn.execute('SELECT COUNT(*) FROM entries WHERE project = ?', (name,)).fetchone()[0]
+        summary = _client_summary(name, client_data, entry_count, time.time())
+        conn.execute(
+            'INSERT OR REPLACE INTO client_summaries '
+            '(name, target_month, platforms, num_posts, num_reels, status, job_id, entry_count, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (name, summary['targetMonth'], json.dumps(summary['platforms']), summary['numPosts'],
+             summary['numReels'], summary['status'], summary['jobId'], entry_count, summary['updatedAt'])
+        )
+
+    def _rebuild_search(self, conn):
+        conn.execute('DELETE FROM entry_facets')
+        conn.execute(
+            "INSERT INTO entry_facets (id, project, date, month, channel, content_type, status, approval) "
+            "SELECT id, project, date, substr(date, 1, 7), json_extract(data, '$.channel'), "
+            "json_extract(data, '$.content_type'), json_extract(data, '$.status'), json_extract(data, '$.approval') "
+            "FROM entries"
+        )
+        if self.full_text:
+            conn.execute('DELETE FROM entries_fts')
+            conn.execute(
+                "INSERT INTO entries_fts (rowid, text_content, hashtags, call_to_action, channel, content_type, status, approval) "
+                "SELECT id, json_extract(data, '$.text_content'), json_extract(data, '$.hashtags'), "
+                "json_extract(data, '$.call_to_action'), json_extract(data, '$.channel'), "
+                "json_extract(data, '$.content_type'), json_extract(data, '$.status'), json_extract(data, '$.approval') "
+                "FROM entries"
+            )
+
+    @classmethod
+    def _rebuild_summaries(cls, conn):
+        conn.execute('DELETE FROM client_summaries')
+        for row in conn.execute('SELECT name, data FROM clients').fetchall():
+            cls._put_summary(conn, row['name'], json.loads(row['data']))
+
+    @staticmethod
+    def _put_project(conn, name, project_fields):
+        conn.execute(
+            'INSERT INTO projects (name, data) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET data = excluded.data',
+            (name, _dumps(project_fields))
+        )
+
+    @classmethod
+    def _write_entries(cls, conn, project, entries):
+        conn.execute('DELETE FROM entries WHERE project = ?', (project,))
+        conn.executemany(
+            'INSERT INTO entries (project, position, date, data) VALUES (?, ?, ?, ?)',
+            [(project, position, entry.get('date'), _dumps(_entry_data(entry))) for position, entry in enumerate(entries)]
+        )
+        cls._touch(conn, project)
+
+
+def open_storage(backend=None, database_path=None, json_path=None):
+    """Create the configured storage backend.
+
+    The SQLite backend imports an existing data.json the first time it
+    starts against an empty database.
+    """
+    backend = backend or os.environ.get('STORAGE_BACKEND', 'sqlite')
+    json_path = json_path or os.environ.get('DATA_FILE', 'data.json')
+    if backend == 'json':
+        return JSONStorage(json_path)
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown storage backend: {backend}")
+
+    storage = SQLiteStorage(database_path or os.environ.get('DATABASE_PATH', 'data.db'))
+    if os.path.exists(json_path):
+        with storage.transaction():
+            # Re-checked under the write lock so only one worker imports
+            if storage.is_empty():
+                storage.import_json(json_path)
+    return storage
+
+
+if __name__ == '__main__':
+    # Usage: python storage.py import [data.json] [data.db]
+    if len(sys.argv) < 2 or sys.argv[1] != 'import':
+        print("Usage: python storage.py import [data.json] [data.db]")
+        sys.exit(1)
+    source = sys.argv[2] if len(sys.argv) > 2 else 'data.json'
+    target = sys.argv[3] if len(sys.argv) > 3 else os.environ.get('DATABASE_PATH', 'data.db')
+    num_clients, num_entries = SQLiteStorage(target).import_json(source)
+    print(f"Imported {num_clients} clients and {num_entries} calendar entries into {target}")
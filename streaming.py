@@ -0,0 +1,67 @@
+import json
+
+
+class JSONArrayStreamParser:
+    """Incrementally parse a top-level JSON array of objects.
+
+    feed() accepts text chunks as they arrive from the model and returns the
+    elements completed by that chunk, so callers can act on each entry
+    without waiting for the closing bracket. Anything before the opening
+    bracket (such as a markdown code fence) is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.started = False
+        self.done = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.item_start = None
+
+    def feed(self, text):
+        self.buffer += text
+        items = []
+        buffer = self.buffer
+        while self.pos < len(buffer) and not self.done:
+            ch = buffer[self.pos]
+            if not self.started:
+                if ch == '[':
+                    self.started = True
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in '{[':
+                if self.depth == 0:
+                    self.item_start = self.pos
+                self.depth += 1
+            elif ch in '}]':
+                if self.depth == 0:
+                    # Closing bracket of the top-level array
+                    self.done = True
+                else:
+                    self.depth -= 1
+                    if self.depth == 0:
+                        items.append(json.loads(buffer[self.item_start:self.pos + 1]))
+                        self.item_start = None
+            self.pos += 1
+
+        # Drop consumed text, keeping any element still in progress
+        keep_from = self.pos if self.item_start is None else self.item_start
+        self.buffer = buffer[keep_from:]
+        self.pos -= keep_from
+        if self.item_start is not None:
+            self.item_start = 0
+        return items
+
+    def close(self):
+        """Raise if the stream ended before the array was complete."""
+        if not self.done:
+            raise json.JSONDecodeError("Unterminated JSON array in model response", self.buffer, self.pos)
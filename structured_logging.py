@@ -0,0 +1,172 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Strings longer than this are summarized instead of logged whole
+MAX_TEXT_CHARS = 500
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def summarize_payload(value, max_chars=MAX_TEXT_CHARS):
+    """Describe a model prompt or response by size and hash instead of dumping it.
+
+    Bytes become {'bytes', 'sha256'}; long strings keep a short head;
+    response-like objects are reduced to their parts (text length, inline
+    data type and size).
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        data = bytes(value)
+        return {'bytes': len(data), 'sha256': _digest(data)}
+    if isinstance(value, str):
+        if len(value) <= max_chars:
+            return value
+        return {'chars': len(value), 'sha256': _digest(value.encode('utf-8')), 'head': value[:80]}
+    if isinstance(value, (list, tuple)):
+        return [summarize_payload(item, max_chars) for item in value[:20]]
+    if isinstance(value, dict):
+        return {str(k): summarize_payload(v, max_chars) for k, v in list(value.items())[:50]}
+    inline = getattr(value, 'inline_data', None)
+    if inline is not None:
+        return {'mime_type': getattr(inline, 'mime_type', None), **summarize_payload(getattr(inline, 'data', b'') or b'')}
+    candidates = getattr(value, 'candidates', None)
+    if candidates is not None or hasattr(value, 'text'):
+        parts = []
+        for candidate in candidates or []:
+            content = getattr(candidate, 'content', None)
+            parts.extend(summarize_payload(part, max_chars) for part in getattr(content, 'parts', None) or [])
+        text = getattr(value, 'text', None)
+        return {'type': type(value).__name__, 'text_chars': len(text) if isinstance(text, str) else None, 'parts': parts}
+    return {'type': type(value).__name__}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line. Structured data goes in extra={'fields': {...}}."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DebugSampler(logging.Filter):
+    """Pass every INFO and above record, but only a share of DEBUG records.
+
+    A record can set its own rate with extra={'sample_rate': ...}.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        return random.random() < getattr(record, 'sample_rate', self.rate)
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # The queue may be full; wait for the listener to make room instead of raising
+        self.queue.put(self._sentinel)
+
+
+class AsyncLogHandler(QueueHandler):
+    """Hand records to a background thread that writes them to the real handlers.
+
+    Emitting only puts the record on a bounded queue; when the queue is
+    full the record is dropped and counted rather than blocking the
+    caller. The listener is drained and stopped before a fork (gunicorn
+    --preload forks workers from a master that has already logged), and
+    each process starts its own on first use afterwards.
+    """
+
+    def __init__(self, handlers, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.targets = list(handlers)
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        os.register_at_fork(
+            before=self._before_fork,
+            after_in_parent=self._after_fork_in_parent,
+            after_in_child=self._after_fork_in_child
+        )
+
+    def _before_fork(self):
+        # Held across the fork so no thread restarts the listener half way through it
+        self._start_lock.acquire()
+        self._stop_listener()
+
+    def _after_fork_in_parent(self):
+        self._start_lock.release()
+
+    def _after_fork_in_child(self):
+        self._start_lock = threading.Lock()
+
+    def _stop_listener(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+        self._listener = None
+        self._pid = None
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # A queue inherited from a parent process has nobody reading it
+            self.queue = queue.Queue(self.queue.maxsize)
+            self._listener = _Listener(self.queue, *self.targets, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Merge args and render tracebacks now; the formatter runs on the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # Drains what is queued so records logged just before exit are written
+        with self._start_lock:
+            self._stop_listener()
+        super().close()
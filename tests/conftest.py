@@ -0,0 +1,68 @@
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench import datagen, fake_genai
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """The app module, with its data, caches and logs in a temporary directory and a fake Gemini client."""
+    workdir = str(tmp_path_factory.mktemp('app'))
+    os.environ.update(
+        DATA_FILE=os.path.join(workdir, 'data.json'),
+        DATABASE_PATH=os.path.join(workdir, 'data.db'),
+        JOBS_DATABASE_PATH=os.path.join(workdir, 'jobs.db'),
+        PREVIEW_CACHE_DIR=os.path.join(workdir, 'cache', 'previews'),
+        INSIGHT_CACHE_DIR=os.path.join(workdir, 'cache', 'insights'),
+        CALENDAR_CACHE_DIR=os.path.join(workdir, 'cache', 'calendars'),
+        RENDER_CACHE_DIR=os.path.join(workdir, 'cache', 'rendered'),
+        VARIANT_CACHE_DIR=os.path.join(workdir, 'cache', 'variants'),
+        RENDER_LOG_DIR=os.path.join(workdir, 'logs'),
+        GOOGLE_API_KEY='test',
+    )
+    # The upload folder is relative to the working directory
+    previous = os.getcwd()
+    os.chdir(workdir)
+    fake_genai.install()
+    import app
+    app.create_app()
+    yield app
+    os.chdir(previous)
+
+
+@pytest.fixture
+def client(app_module):
+    """A test client that is logged in."""
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['authenticated'] = True
+    return client
+
+
+@pytest.fixture
+def project(app_module):
+    """A new client whose calendar has five pending entries in 2026-03."""
+    name = f"Test Client {uuid.uuid4().hex[:8]}"
+    app_module.storage.create_client(name, {
+        'companyName': name,
+        'numPosts': 5,
+        'numReels': 0,
+        'platforms': ['instagram'],
+        'targetMonth': '2026-03',
+        'suggestions': '',
+        'status': 'ready'
+    })
+    rng = random.Random(name)
+    entries = [datagen.generate_entry(rng, datetime(2026, 3, 1) + timedelta(days=day)) for day in range(5)]
+    for entry in entries:
+        entry['approval'] = 'pending'
+    app_module.storage.merge_month(name, '2026-03', entries)
+    return name
@@ -0,0 +1,80 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from storage import JSONStorage, SQLiteStorage
+
+
+def entry(date, **fields):
+    return dict({'date': date, 'channel': 'Instagram', 'content_type': 'Image', 'approval': 'pending',
+                 'text_content': 'generated'}, **fields)
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'json':
+        return JSONStorage(str(tmp_path / 'data.json'))
+    return SQLiteStorage(str(tmp_path / 'data.db'))
+
+
+def calendar(storage):
+    return sorted((e['date'], e['text_content']) for e in storage.get_project('Client')['calendar_entries'])
+
+
+def test_merge_replaces_untouched_entries_of_the_month_only(storage):
+    storage.merge_month('Client', '2026-03', [entry('2026-03-01'), entry('2026-03-02')])
+    storage.merge_month('Client', '2026-04', [entry('2026-04-01')])
+    assert storage.merge_month('Client', '2026-03', [entry('2026-03-05', text_content='again')]) == (1, 0)
+    assert calendar(storage) == [('2026-03-05', 'again'), ('2026-04-01', 'generated')]
+
+
+def test_merge_keeps_edited_and_approved_entries(storage):
+    storage.merge_month('Client', '2026-03', [entry('2026-03-01'), entry('2026-03-02'), entry('2026-03-03')])
+    first, second, _ = storage.get_project('Client')['calendar_entries']
+    storage.patch_entries([(first['id'], 1, {'text_content': 'edited'})])
+    storage.patch_entries([(second['id'], 1, {'approval': 'approved'})])
+    added, skipped = storage.merge_month('Client', '2026-03', [
+        entry('2026-03-01', text_content='new'),
+        entry('2026-03-02', content_type='Reel', text_content='new reel'),
+        entry('2026-03-03', text_content='new'),
+    ])
+    assert (added, skipped) == (2, 1)
+    assert calendar(storage) == [
+        ('2026-03-01', 'edited'), ('2026-03-02', 'generated'), ('2026-03-02', 'new reel'), ('2026-03-03', 'new')
+    ]
+    assert [e['version'] for e in storage.get_project('Client')['calendar_entries'] if e['id'] == first['id']] == [2]
+
+
+@pytest.mark.parametrize('entry_date, first_day, last_day, expected', [
+    # A chunk's date moves to the same day of the chunk's month when that day is in range
+    ('2026-04-15', '2026-03-11', '2026-03-20', '2026-03-15'),
+    ('2026-04-25', '2026-03-11', '2026-03-20', '2026-03-20'),
+    ('2026-02-03', '2026-03-11', '2026-03-20', '2026-03-11'),
+    # Days the target month does not have go to the nearest end of the range
+    ('2026-01-31', '2026-02-01', '2026-02-28', '2026-02-01'),
+    ('2026-03-31', '2026-02-01', '2026-02-28', '2026-02-28'),
+    ('2026-02-10', '2026-02-01', '2026-02-28', '2026-02-10'),
+])
+def test_clamp_entry_date(app_module, entry_date, first_day, last_day, expected):
+    day = lambda value: datetime.strptime(value, '%Y-%m-%d')
+    assert app_module.clamp_entry_date(day(entry_date), day(first_day), day(last_day)) == day(expected)
+
+
+def test_bulk_generation_keeps_reviewed_entries(app_module, client, project):
+    edited = app_module.storage.get_project(project)['calendar_entries'][0]
+    client.patch(f"/entries/{edited['id']}", json={'text_content': 'edited by hand'}, headers={'If-Match': '1'})
+    response = client.post('/calendars/bulk', json={'items': [
+        {'client': project, 'month': '2026-03', 'numPosts': 4, 'numReels': 0, 'platforms': ['instagram']}
+    ]})
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    deadline = time.time() + 30
+    while (job := client.get(f'/calendars/bulk/{job_id}').get_json())['status'] not in ('done', 'failed'):
+        assert time.time() < deadline
+        time.sleep(0.05)
+    assert job['status'] == 'done'
+    entries = app_module.storage.get_project(project)['calendar_entries']
+    assert [e['text_content'] for e in entries if e['id'] == edited['id']] == ['edited by hand']
+    assert all(e['date'].startswith('2026-03') for e in entries)
+    assert len(entries) > 1
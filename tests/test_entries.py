@@ -0,0 +1,52 @@
+def first_entry(app_module, project):
+    return app_module.storage.get_project(project)['calendar_entries'][0]
+
+
+def test_patch_with_current_version(app_module, client, project):
+    entry = first_entry(app_module, project)
+    response = client.patch(f"/entries/{entry['id']}", json={'status': 'done'}, headers={'If-Match': '"1"'})
+    assert response.status_code == 200
+    assert response.headers['ETag'] == '"2"'
+    assert response.get_json()['entry']['status'] == 'done'
+    assert first_entry(app_module, project)['version'] == 2
+
+
+def test_patch_with_stale_version_conflicts(app_module, client, project):
+    entry = first_entry(app_module, project)
+    client.patch(f"/entries/{entry['id']}", json={'status': 'done'}, headers={'If-Match': '1'})
+    response = client.patch(f"/entries/{entry['id']}", json={'status': 'in progress'}, headers={'If-Match': 'W/"1"'})
+    assert response.status_code == 409
+    assert response.headers['ETag'] == '"2"'
+    assert response.get_json()['entry']['status'] == 'done'
+    assert first_entry(app_module, project)['status'] == 'done'
+
+
+def test_patch_needs_a_version(app_module, client, project):
+    entry = first_entry(app_module, project)
+    assert client.patch(f"/entries/{entry['id']}", json={'status': 'done'}).status_code == 428
+    assert client.patch(f"/entries/{entry['id']}", json={'status': 'done'}, headers={'If-Match': 'abc'}).status_code == 400
+
+
+def test_version_field_instead_of_if_match(app_module, client, project):
+    entry = first_entry(app_module, project)
+    response = client.patch(f"/entries/{entry['id']}", json={'status': 'done', 'version': 1})
+    assert response.status_code == 200
+    assert client.patch(f"/entries/{entry['id']}", json={'status': 'done', 'version': 1}).status_code == 409
+
+
+def test_delete_with_stale_version_conflicts(app_module, client, project):
+    entry = first_entry(app_module, project)
+    client.patch(f"/entries/{entry['id']}", json={'status': 'done'}, headers={'If-Match': '1'})
+    assert client.delete(f"/entries/{entry['id']}", headers={'If-Match': '1'}).status_code == 409
+    assert client.delete(f"/entries/{entry['id']}", headers={'If-Match': '2'}).status_code == 200
+    assert client.delete(f"/entries/{entry['id']}", headers={'If-Match': '2'}).status_code == 404
+
+
+def test_bulk_conflict_changes_nothing(app_module, client, project):
+    first, second = app_module.storage.get_project(project)['calendar_entries'][:2]
+    response = client.post('/entries/bulk', json={'changes': [
+        {'id': first['id'], 'version': 1, 'fields': {'status': 'done'}},
+        {'id': second['id'], 'version': 5, 'fields': {'status': 'done'}},
+    ]})
+    assert response.status_code == 409
+    assert first_entry(app_module, project)['version'] == 1
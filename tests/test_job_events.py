@@ -0,0 +1,75 @@
+import json
+import time
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def make_job(app_module):
+    """Store a job row directly, so the app's workers never claim it."""
+    queue = app_module.job_queue
+
+    def make(status, events=()):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with queue._transaction() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, status, payload, attempts, lease_until, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, 1, ?, ?, ?)',
+                (job_id, 'test', status, '{}', now + 3600, now, now)
+            )
+        for data in events:
+            queue.add_event(job_id, data)
+        return job_id
+    return make
+
+
+def read_events(response):
+    """Parse a server-sent events body into (id, event, data) tuples."""
+    events = []
+    for block in b''.join(response.response).decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'data' in fields:
+            events.append((fields.get('id'), fields.get('event'), json.loads(fields['data'])))
+    return events
+
+
+def test_stream_ends_with_status(client, make_job):
+    job_id = make_job('done', [{'type': 'entry', 'n': 1}, {'type': 'entry', 'n': 2}])
+    events = read_events(client.get(f'/jobs/{job_id}/events', buffered=False))
+    assert [(event, data.get('n')) for _, event, data in events] == [('entry', 1), ('entry', 2), ('status', None)]
+    assert events[-1][2]['status'] == 'done'
+
+
+def test_last_event_id_resumes_after_it(client, make_job):
+    job_id = make_job('done', [{'type': 'entry', 'n': 1}, {'type': 'entry', 'n': 2}])
+    first_id = read_events(client.get(f'/jobs/{job_id}/events', buffered=False))[0][0]
+    events = read_events(client.get(f'/jobs/{job_id}/events', headers={'Last-Event-ID': first_id}, buffered=False))
+    assert [data.get('n') for _, _, data in events] == [2, None]
+
+
+@pytest.mark.parametrize('query, headers', [
+    ('', {'Last-Event-ID': 'abc'}),
+    ('?after=1.5', {}),
+    ('?after=', {'Last-Event-ID': 'x'}),
+])
+def test_bad_event_ids_are_rejected(client, make_job, query, headers):
+    job_id = make_job('done')
+    response = client.get(f'/jobs/{job_id}/events{query}', headers=headers)
+    assert response.status_code == 400
+
+
+def test_unknown_job_is_not_found(client):
+    assert client.get(f'/jobs/{uuid.uuid4().hex}/events').status_code == 404
+
+
+def test_stream_ends_when_job_disappears(app_module, client, make_job):
+    job_id = make_job('running', [{'type': 'entry', 'n': 1}])
+    # The stream has started (its first event is sent when the response is created) when the job goes
+    response = client.get(f'/jobs/{job_id}/events', buffered=False)
+    with app_module.job_queue._transaction() as conn:
+        conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+    events = read_events(response)
+    assert [event for _, event, _ in events] == ['entry', 'status']
+    assert events[-1][2] == {'status': 'gone', 'error': 'Job not found'}
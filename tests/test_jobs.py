@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from jobs import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.db'), workers=1, lease_seconds=60, max_attempts=2, poll_interval=0.01)
+
+
+def wait_for(queue, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def expire_lease(queue, job_id):
+    with queue._transaction() as conn:
+        conn.execute('UPDATE jobs SET lease_until = ? WHERE id = ?', (time.time() - 1, job_id))
+
+
+def test_job_runs_to_done(queue):
+    queue.register('echo')(lambda payload, job_id: {'echo': payload['value']})
+    queue.start()
+    job = wait_for(queue, queue.submit('echo', {'value': 3}))
+    assert (job['status'], job['result'], job['attempts']) == ('done', {'echo': 3}, 1)
+
+
+def test_failing_job_calls_failure_hook(queue):
+    failures = []
+
+    def fail(payload, job_id):
+        raise RuntimeError('boom')
+
+    queue.register('fail')(fail)
+    queue.on_failure('fail')(lambda payload, job_id, error: failures.append((payload, job_id, error)))
+    queue.start()
+    job_id = queue.submit('fail', {'value': 1})
+    job = wait_for(queue, job_id)
+    assert (job['status'], job['error']) == ('failed', 'boom')
+    assert failures == [({'value': 1}, job_id, 'boom')]
+
+
+def test_expired_lease_is_claimed_again(queue):
+    job_id = queue.submit('slow', {})
+    assert queue._claim()[0] == job_id
+    # Still leased: no other worker may take it
+    assert queue._claim() is None
+    expire_lease(queue, job_id)
+    assert queue._claim()[0] == job_id
+    assert queue.get(job_id)['attempts'] == 2
+
+
+def test_extended_lease_is_not_claimed(queue):
+    queue.lease_seconds = 0
+    job_id = queue.submit('slow', {})
+    queue._claim()
+    queue.lease_seconds = 60
+    queue.extend_lease(job_id)
+    assert queue._claim() is None
+
+
+def test_job_abandoned_after_max_attempts(queue):
+    failures = []
+    queue.on_failure('slow')(lambda payload, job_id, error: failures.append(job_id))
+    job_id = queue.submit('slow', {})
+    for _ in range(queue.max_attempts):
+        queue._claim()
+        expire_lease(queue, job_id)
+    assert queue._claim() is None
+    job = queue.get(job_id)
+    assert job['status'] == 'failed'
+    assert 'abandoned' in job['error']
+    assert failures == [job_id]
+
+
+def test_retry_requeues_failed_jobs_only(queue):
+    job_id = queue.submit('slow', {})
+    assert not queue.retry(job_id)
+    queue._claim()
+    queue._finish(job_id, 'failed', error='boom')
+    queue.add_event(job_id, {'type': 'month', 'status': 'done'})
+    assert queue.retry(job_id)
+    job = queue.get(job_id)
+    assert (job['status'], job['error'], job['attempts']) == ('queued', None, 0)
+    assert [data for _, data in queue.events(job_id)] == [{'type': 'month', 'status': 'done'}]
+
+
+def test_failed_add_client_releases_its_reservation(app_module):
+    storage = app_module.storage
+    storage.create_client('Reserved Client', {'companyName': 'Reserved Client', 'status': 'generating', 'jobId': 'job-1'})
+    payload = {'client': {'companyName': 'Reserved Client'}, 'images': []}
+    app_module.release_reserved_client(payload, 'job-2', 'boom')
+    assert storage.get_client('Reserved Client') is not None
+    app_module.release_reserved_client(payload, 'job-1', 'boom')
+    assert storage.get_client('Reserved Client') is None
@@ -0,0 +1,5 @@
+from bench import startup
+
+
+def test_startup_within_budget():
+    assert startup.main(['--runs', '1']) == 0
@@ -0,0 +1,57 @@
+import io
+
+# Requested widths are rounded up to one of these, so arbitrary ?w= values share variants
+WIDTHS = (150, 300, 600, 1080)
+
+# Variant format -> (Pillow format, mimetype, save options)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def snap_width(width):
+    """Round a requested width up to the nearest supported variant width."""
+    for candidate in WIDTHS:
+        if width <= candidate:
+            return candidate
+    return WIDTHS[-1]
+
+
+def webp_available():
+    from PIL import features
+    return features.check('webp')
+
+
+def negotiate_format(requested, accept_mimetypes):
+    """Pick a variant format from an explicit fmt parameter or the Accept header.
+
+    Returns (format, negotiated), where negotiated means the choice came
+    from Accept and responses must vary on it. Raises ValueError for an
+    unknown fmt.
+    """
+    if requested:
+        if requested not in FORMATS:
+            raise ValueError(f"fmt must be one of {', '.join(FORMATS)}")
+        if requested == 'webp' and not webp_available():
+            return 'jpeg', False
+        return requested, False
+    if accept_mimetypes.quality('image/webp') > 0 and webp_available():
+        return 'webp', True
+    return 'jpeg', True
+
+
+def make_variant(data, width, fmt):
+    """Downscale an image to width (never upscaling) and encode it as fmt. Returns bytes."""
+    from PIL import Image
+    pil_format, _, options = FORMATS[fmt]
+    with Image.open(io.BytesIO(data)) as image:
+        # Lets JPEG sources decode at reduced scale
+        image.draft('RGB', (width, width))
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA') or (fmt == 'jpeg' and image.mode == 'RGBA'):
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()